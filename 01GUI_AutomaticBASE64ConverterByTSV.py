@@ -8,22 +8,51 @@
 
 
 import sys
-import os
-import base64
-import pandas as pd
-from ffmpy import FFmpeg
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QLabel,
     QPushButton, QLineEdit, QVBoxLayout, QWidget, QComboBox,
-    QProgressBar, QListWidget, QListWidgetItem, QAbstractItemView, QCheckBox, QGroupBox, QMessageBox
+    QProgressBar, QListWidget, QListWidgetItem, QAbstractItemView, QCheckBox, QGroupBox, QMessageBox,
+    QSpinBox, QHBoxLayout
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from Base64ToWavEngine import read_columns, convert_export
+
+
+class ConversionWorker(QThread):
+    """
+    Runs Base64ToWavEngine.convert_export off the Qt main thread.
+    Settings are read from the widgets before the thread starts; results go back via signals.
+    Cancelling (requestInterruption) stops cleanly after the chunk being converted.
+    """
+    progress = pyqtSignal(int, int, float, float)  # rows done, total rows, rows per second, ETA in seconds
+    row_failed = pyqtSignal(int, str)               # row index, error message
+    completed = pyqtSignal(int, int, int, bool)     # converted rows, skipped rows, failed rows, cancelled
+    aborted = pyqtSignal(str)                       # error that stopped the whole conversion
+
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+
+    def run(self):
+        # An exception escaping QThread.run would abort the application, so report it instead
+        # (e.g. unwritable output folder, missing column, unparsable file)
+        try:
+            result = convert_export(**self.settings,
+                                    on_progress=self.progress.emit,
+                                    on_failure=self.row_failed.emit,
+                                    should_cancel=self.isInterruptionRequested)
+        except Exception as e:
+            self.aborted.emit(f"{type(e).__name__}: {e}")
+            return
+        self.completed.emit(*result)
+
 
 class Base64ToWavApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Base64 to WAV Converter")
         self.resize(600, 800)  # window size
+        self.worker = None
         self.initUI()
 
     def initUI(self):
@@ -57,6 +86,44 @@ class Base64ToWavApp(QMainWindow):
         self.convert_checkbox = QCheckBox("Convert WAV to 16kHz Mono (for automatic forced alignment)")
         self.convert_checkbox.setChecked(False)
 
+        # Engine used for the 16kHz mono conversion
+        self.resampler_label = QLabel("16kHz mono conversion engine:")
+        self.resampler_combobox = QComboBox()
+        self.resampler_combobox.addItem("FFmpeg (same pass)", "ffmpeg")
+        self.resampler_combobox.addItem("NumPy (in-process)", "numpy")
+        resampler_layout = QHBoxLayout()
+        resampler_layout.addWidget(self.resampler_label)
+        resampler_layout.addWidget(self.resampler_combobox)
+
+        # Keep decoded WebM checkbox
+        self.webm_checkbox = QCheckBox("Keep decoded WebM files")
+        self.webm_checkbox.setChecked(False)
+
+        # Skip rows converted by an earlier run (conversion_manifest.jsonl in the output folder)
+        self.resume_checkbox = QCheckBox("Skip rows already converted with the same settings (resume)")
+        self.resume_checkbox.setChecked(True)
+
+        # Streaming options (large exports)
+        self.stream_checkbox = QCheckBox("Read input in chunks (low memory for large files)")
+        self.stream_checkbox.setChecked(True)
+        self.chunk_label = QLabel("Rows per chunk:")
+        self.chunk_spinbox = QSpinBox()
+        self.chunk_spinbox.setRange(1, 100000)
+        self.chunk_spinbox.setValue(100)
+        self.stream_checkbox.toggled.connect(self.chunk_spinbox.setEnabled)
+        chunk_layout = QHBoxLayout()
+        chunk_layout.addWidget(self.chunk_label)
+        chunk_layout.addWidget(self.chunk_spinbox)
+
+        # Number of parallel worker processes (1 = convert in this process)
+        self.workers_label = QLabel("Worker processes:")
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, 64)
+        self.workers_spinbox.setValue(1)
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(self.workers_label)
+        workers_layout.addWidget(self.workers_spinbox)
+
         # File list options group
         file_list_group = QGroupBox("File List Options")
         file_list_layout = QVBoxLayout()
@@ -94,6 +161,11 @@ class Base64ToWavApp(QMainWindow):
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
 
+        # Throughput / ETA and per-row failures reported by the worker
+        self.status_label = QLabel("")
+        self.failure_list = QListWidget()
+        self.failure_list.setMaximumHeight(80)
+
         # Process button
         self.process_button = QPushButton("Start to Process Files")
         self.process_button.setStyleSheet("""
@@ -111,6 +183,11 @@ class Base64ToWavApp(QMainWindow):
         self.process_button.setFixedSize(200, 50)  # button size (width height)
         self.process_button.clicked.connect(self.process_files)
 
+        # Cancel button (stops after the current chunk)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_processing)
+
         # Adding widgets to layout
         layout.addWidget(self.file_label)
         layout.addWidget(self.file_input)
@@ -122,13 +199,22 @@ class Base64ToWavApp(QMainWindow):
         layout.addWidget(self.naming_list)
         layout.addWidget(self.index_checkbox)
         layout.addWidget(self.convert_checkbox)
+        layout.addLayout(resampler_layout)
+        layout.addWidget(self.webm_checkbox)
+        layout.addWidget(self.resume_checkbox)
+        layout.addWidget(self.stream_checkbox)
+        layout.addLayout(chunk_layout)
+        layout.addLayout(workers_layout)
         layout.addWidget(file_list_group)
         layout.addWidget(self.output_label)
         layout.addWidget(self.output_input)
         layout.addWidget(self.output_button)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.failure_list)
   #     layout.addWidget(self.process_button) # 與下方重複
         layout.addWidget(self.process_button, alignment=Qt.AlignCenter)
+        layout.addWidget(self.cancel_button, alignment=Qt.AlignCenter)
 
         container = QWidget()
         container.setLayout(layout)
@@ -156,20 +242,17 @@ class Base64ToWavApp(QMainWindow):
 
     def load_file(self, file_path):
         try:
-            if file_path.endswith(".tsv"):
-                self.df = pd.read_csv(file_path, sep="\t")
-            elif file_path.endswith(".csv"):
-                self.df = pd.read_csv(file_path)
-            else:
-                raise ValueError("Unsupported file format! Please select a TSV or CSV file.")
-            
+            # Only the header is read here; rows are read again by the engine
+            self.columns = read_columns(file_path)
+            self.file_path = file_path
+
             # Populate column selectors
             self.base64_combobox.clear()
             self.naming_list.clear()
             self.content_combobox.clear()
-            self.base64_combobox.addItems(self.df.columns)
-            self.content_combobox.addItems(self.df.columns)
-            for col in self.df.columns:
+            self.base64_combobox.addItems(self.columns)
+            self.content_combobox.addItems(self.columns)
+            for col in self.columns:
                 item = QListWidgetItem(col)
                 item.setCheckState(0)
                 self.naming_list.addItem(item)
@@ -197,85 +280,77 @@ class Base64ToWavApp(QMainWindow):
         return selected_columns
 
     def process_files(self):
-        base64_col = self.base64_combobox.currentText()
-        selected_columns = self.get_selected_columns()
-        output_dir = self.output_input.text()
-
-        # Ensure the wav and txt directories exist
-        wav_dir = os.path.join(output_dir, "wav")
-        txt_dir = os.path.join(output_dir, "txt")
-        os.makedirs(wav_dir, exist_ok=True)
-        os.makedirs(txt_dir, exist_ok=True)
-
-        total_rows = len(self.df)
-        self.progress_bar.setMaximum(total_rows)
-
-        converted_files = []  # Store successfully converted file names
-        content_values = []   # Store content values if applicable
-
-        for index, row in self.df.iterrows():
-            try:
-                # Generate file name using selected columns
-                file_base = "_".join([str(row[col]) for col in selected_columns])
-                if self.index_checkbox.isChecked():
-                    file_base += f"_index{index}"  # Add index if checkbox is checked
-                webm_file = os.path.join(wav_dir, f"{file_base}.webm")
-                wav_file = os.path.join(wav_dir, f"{file_base}.wav")
-
-                # Decode Base64 to WebM
-                s = str(row[base64_col]).strip()
-                s += '=' * (-len(s) % 4)  # Padding Base64 string
-                decoded_data = base64.b64decode(s)
-                with open(webm_file, 'wb') as f:
-                    f.write(decoded_data)
-
-                # Convert webm to WAV using FFmpeg
-                ff = FFmpeg(
-                    inputs={webm_file: None},
-                    outputs={wav_file: '-c:a pcm_f32le'}
-                )
-                ff.run()
-
-                # If "Convert WAV to 16kHz Mono" is checked
-                if self.convert_checkbox.isChecked():
-                    temp_wav = os.path.join(wav_dir, f"{file_base}_16khz_mono.wav")
-                    ff_convert = FFmpeg(
-                        inputs={wav_file: None},
-                        outputs={temp_wav: '-ar 16000 -ac 1'}
-                    )
-                    ff_convert.run()
-                    os.replace(temp_wav, wav_file)  # Replace original WAV file
-
-                # Add to converted files list
-                converted_files.append(f"{file_base}.wav")
-
-                # If content column is selected, store content values
-                if self.content_checkbox.isChecked():
-                    content_values.append(row[self.content_combobox.currentText()])
-                else:
-                    content_values.append("")  # Empty content
-
-                # Update progress bar
-                self.progress_bar.setValue(index + 1)
-
-            except Exception as e:
-                print(f"Error processing row {index}: {e}")
-
-        # Generate file list if checkbox is checked
-        if self.file_list_checkbox.isChecked():
-            file_list_path = os.path.join(output_dir, "file_list.csv")
-            file_list_df = pd.DataFrame({"filename": converted_files, "content": content_values})
-            file_list_df.to_csv(file_list_path, index=False)
-
-            # Generate TXT files if checkbox is checked
-            if self.txt_checkbox.isChecked():
-                for fname, content in zip(file_list_df["filename"], file_list_df["content"]):
-                    txt_file = os.path.join(txt_dir, f"{os.path.splitext(fname)[0]}.txt")
-                    with open(txt_file, "w", encoding="utf-8") as f:
-                        f.write(str(content) if pd.notna(content) else "")
+        if self.worker is not None:
+            return  # a conversion is already running
+        settings = {
+            "file_path": self.file_path,
+            "base64_col": self.base64_combobox.currentText(),
+            "naming_columns": self.get_selected_columns(),
+            "content_col": self.content_combobox.currentText() if self.content_checkbox.isChecked() else None,
+            "output_dir": self.output_input.text(),
+            "include_index": self.index_checkbox.isChecked(),
+            "to_16k_mono": self.convert_checkbox.isChecked(),
+            "resampler": self.resampler_combobox.currentData(),
+            "keep_webm": self.webm_checkbox.isChecked(),
+            "chunk_size": self.chunk_spinbox.value() if self.stream_checkbox.isChecked() else None,
+            "workers": self.workers_spinbox.value(),
+            "file_list": self.file_list_checkbox.isChecked(),
+            # TXT files are generated from the file list, as before
+            "write_txt": self.file_list_checkbox.isChecked() and self.txt_checkbox.isChecked(),
+            "resume": self.resume_checkbox.isChecked(),
+        }
+
+        self.progress_bar.setValue(0)
+        self.failure_list.clear()
+        self.status_label.setText("Starting...")
+        self.process_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+
+        self.worker = ConversionWorker(settings, self)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.row_failed.connect(self.report_failure)
+        self.worker.completed.connect(self.conversion_completed)
+        self.worker.aborted.connect(self.conversion_aborted)
+        self.worker.start()
+
+    def cancel_processing(self):
+        """Ask the worker to stop after the chunk it is converting."""
+        if self.worker is not None:
+            self.worker.requestInterruption()
+            self.cancel_button.setEnabled(False)
+            self.status_label.setText(self.status_label.text() + " - cancelling after current chunk...")
+
+    def update_progress(self, done, total, rate, eta):
+        self.progress_bar.setMaximum(max(total, done))
+        self.progress_bar.setValue(done)
+        minutes, seconds = divmod(int(eta), 60)
+        self.status_label.setText(f"{done}/{total} rows - {rate:.1f} rows/s - ETA {minutes:02d}:{seconds:02d}")
+
+    def report_failure(self, index, message):
+        print(f"Error processing row {index}: {message}")
+        self.failure_list.addItem(f"Row {index}: {message}")
+
+    def finish_worker(self):
+        self.worker.wait()
+        self.worker = None
+        self.process_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    def conversion_aborted(self, message):
+        self.finish_worker()
+        print(f"Error converting file: {message}")
+        self.status_label.setText(f"Stopped: {message}")
+        QMessageBox.critical(self, "Error", f"The conversion stopped with an error:\n{message}")
+
+    def conversion_completed(self, converted, skipped, failed, cancelled):
+        self.finish_worker()
 
         # Show completion message
-        QMessageBox.information(self, "Completed", "Process completed successfully!")
+        summary = f"{converted} files converted, {skipped} already up to date, {failed} rows failed."
+        if cancelled:
+            QMessageBox.information(self, "Cancelled", f"Process cancelled. {summary}")
+        else:
+            QMessageBox.information(self, "Completed", f"Process completed successfully! {summary}")
 
 # Start the application
 if __name__ == '__main__':
@@ -1,62 +1,608 @@
-import os
-import shutil
-import subprocess
-
-def process_files(folder_a, folder_b, folder_c, batch_size, pl_script_path):
-    wav_dir = os.path.join(folder_b, 'wav')
-    if not os.path.exists(wav_dir):
-        os.makedirs(wav_dir)
-
-    while True:
-        files = [f for f in os.listdir(folder_a) if os.path.isfile(os.path.join(folder_a, f))]
-        
-        # WAVファイルと対応するTXTファイルをペアで抽出
-        pairs = []
-        for file in files:
-            if file.endswith('.wav'):
-                txt_file = file.replace('.wav', '.txt')
-                if txt_file in files:
-                    pairs.append((file, txt_file))
-        
-        # バッチサイズ分のペアを取り出す
-        batch = pairs[:batch_size]
-        if not batch:  # ファイルがなくなったら終了
-            print("No more files to process.")
-            break
-
-        # バッチのファイルをフォルダーBの./wavにコピー
-        for wav_file, txt_file in batch:
-            shutil.copy(os.path.join(folder_a, wav_file), os.path.join(wav_dir, wav_file))
-            shutil.copy(os.path.join(folder_a, txt_file), os.path.join(wav_dir, txt_file))
-
-        print(f"Copied {len(batch)} files to ./wav directory.")
-
-        # .pl スクリプトを実行
-        print(f"Running Perl script: {pl_script_path}")
-        try:
-            subprocess.run(['perl', pl_script_path], cwd=folder_b, check=True, text=True, capture_output=True)
-            print("Perl script executed successfully.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error occurred while running Perl script: {e.stderr}")
-            break
-
-        # フォルダーBのファイルをフォルダーCに移動
-        for file in os.listdir(wav_dir):
-            shutil.move(os.path.join(wav_dir, file), folder_c)
-
-        print("Moved files from ./wav directory to folder C.")
-
-        # フォルダーAから使用済みのファイルを削除
-        for wav_file, txt_file in batch:
-            os.remove(os.path.join(folder_a, wav_file))
-            os.remove(os.path.join(folder_a, txt_file))
-
-        print(f"Processed {len(batch)} files. Moving to next batch...")
-
-# 設定
-folder_a = "C:/Users/batt7/Desktop/sokuon_txt_wav/"
-folder_b = "C:/Users/batt7/Documents/segmentation-kit-4.3.1/"
-folder_c = "C:/Users/batt7/Desktop/sokuon_result/"
-batch_size = 96
-pl_script_path = "C:/Users/batt7/Documents/segmentation-kit-4.3.1/segment_julius.pl"
-process_files(folder_a, folder_b, folder_c, batch_size, pl_script_path)
+import os
+import time
+import shutil
+import signal
+import sqlite3
+import struct
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from WavHeader import read_wav_header, WavFormatError
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # Linux 以外、または未インストールならポーリングで監視する
+    INotify = None
+
+
+def scan_pairs(folder_a):
+    # フォルダーAを1回だけ走査し、stem ごとに WAV と TXT をまとめたキューを作る
+    wav_stems, txt_stems = set(), set()
+    with os.scandir(folder_a) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            if ext == '.wav':
+                wav_stems.add(stem)
+            elif ext == '.txt':
+                txt_stems.add(stem)
+
+    # WAVファイルと対応するTXTファイルをペアで抽出
+    return deque((f'{stem}.wav', f'{stem}.txt') for stem in sorted(wav_stems & txt_stems))
+
+
+def pair_stem(pair):
+    return os.path.splitext(pair[0])[0]
+
+
+class JobJournal:
+    # 各ペアの状態を SQLite に記録し、中断後の再実行で未完了の分だけをやり直せるようにする
+    # queued → staged（./wav に配置）→ aligned（Julius 完了）→ collected（フォルダーCへ移動済み）
+    # 隔離したペアは failed
+    def __init__(self, path):
+        self.path = path
+        # ワーカープロセスも同じファイルに書き込むので WAL モードにしてロック待ちを許す
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS pairs (
+                                           stem TEXT PRIMARY KEY,
+                                           state TEXT NOT NULL,
+                                           workspace TEXT,
+                                           message TEXT,
+                                           updated REAL)''')
+
+    def add(self, pairs):
+        # 未登録のペアだけ queued として登録する（登録済みの状態は変えない）
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO pairs (stem, state, updated) VALUES (?, 'queued', ?)",
+                [(pair_stem(pair), time.time()) for pair in pairs])
+
+    def set_state(self, pairs, state, workspace=None, message=None):
+        with self.connection:
+            self.connection.executemany(
+                'UPDATE pairs SET state = ?, workspace = ?, message = ?, updated = ? WHERE stem = ?',
+                [(state, workspace, message, time.time(), pair_stem(pair)) for pair in pairs])
+
+    def states(self):
+        # stem -> (状態, ワークスペース)
+        return {stem: (state, workspace) for stem, state, workspace
+                in self.connection.execute('SELECT stem, state, workspace FROM pairs')}
+
+    def close(self):
+        self.connection.close()
+
+
+def create_workspaces(folder_b, count):
+    # segmentation-kit をワークスペースとして count 個コピー（./wav の中身は除く）
+    # 各ワークスペースで segment_julius.pl を同時に実行できるようにする
+    kit_dir = os.path.normpath(folder_b)
+    kit_wav_dir = os.path.join(kit_dir, 'wav')
+    root = kit_dir + '_workspaces'
+
+    def ignore_wav_contents(directory, names):
+        return names if os.path.normpath(directory) == kit_wav_dir else []
+
+    workspaces = []
+    for i in range(count):
+        workspace = os.path.join(root, f'workspace{i + 1}')
+        if not os.path.exists(workspace):
+            shutil.copytree(kit_dir, workspace, ignore=ignore_wav_contents)
+            print(f"Created workspace: {workspace}")
+        workspaces.append(workspace)
+    return workspaces
+
+
+def workspace_script(pl_script_path, folder_b, workspace):
+    # スクリプトがキット内にあればワークスペース側のコピーを使う
+    # Perl はワークスペースを cwd にして実行するので、相対パスは返さない
+    script_path = os.path.abspath(pl_script_path)
+    try:
+        rel_path = os.path.relpath(script_path, os.path.abspath(folder_b))
+    except ValueError:  # 別ドライブ (Windows)
+        return script_path
+    if rel_path.startswith(os.pardir):
+        return script_path
+    return os.path.abspath(os.path.join(workspace, rel_path))
+
+
+def stage_file(src, dst, staging):
+    # staging = 'copy': コピー（従来の動作）
+    # staging = 'link': ハードリンク（別デバイスなどで作れないときはコピー）
+    # staging = 'move': リネームで移動（別デバイスのときは shutil.move）
+    if staging == 'link':
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    elif staging == 'move':
+        try:
+            os.replace(src, dst)
+        except OSError:
+            shutil.move(src, dst)
+        return
+    shutil.copy(src, dst)
+
+
+def collect_file(src, dst_dir):
+    # 同じファイルシステムならリネームだけで移動する
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.move(src, dst)
+
+
+def unstage_batch(wav_dir, batch, folder_a, staging):
+    # 失敗したバッチを ./wav から片付ける（'move' のときは元ファイルをフォルダーAに戻す）
+    for wav_file, txt_file in batch:
+        for file in (wav_file, txt_file):
+            path = os.path.join(wav_dir, file)
+            if not os.path.exists(path):
+                continue
+            if staging == 'move':
+                collect_file(path, folder_a)
+            else:
+                os.remove(path)
+    # Julius が途中まで出力したファイルも消す
+    for file in os.listdir(wav_dir):
+        os.remove(os.path.join(wav_dir, file))
+
+
+def quarantine_pair(pair, folder_a, quarantine_dir, staging, output, log):
+    # 原因のペアと Julius のログを隔離フォルダーに置く（ペアは unstage_batch でフォルダーAに戻してある）
+    os.makedirs(quarantine_dir, exist_ok=True)
+    wav_file, txt_file = pair
+    stem = os.path.splitext(wav_file)[0]
+    if log is not None:
+        with open(os.path.join(quarantine_dir, f'{stem}.log'), 'wb') as f:
+            f.write(log)
+    with open(os.path.join(quarantine_dir, f'{stem}.julius_error.txt'), 'w', encoding='utf-8') as f:
+        f.write(output)
+    for file in (wav_file, txt_file):
+        dst = os.path.join(quarantine_dir, file)
+        if os.path.exists(dst):  # やり直して再び失敗したペア
+            os.remove(dst)
+        stage_file(os.path.join(folder_a, file), dst, staging)
+
+
+class KitFailure(Exception):
+    # 入力に関係なく Perl スクリプトが失敗した（スクリプトのパス、Julius や Perl 自体の問題）
+    def __init__(self, output):
+        super().__init__(output)
+        self.output = output
+
+
+def run_batch(workspace, pl_script_path, batch, folder_a, folder_c, staging='copy', quarantine_dir=None,
+              journal_path=None, kit_verified=False):
+    # 1バッチ分の処理（ワーカープロセスで実行される）
+    # kit_verified: この実行ですでに成功したバッチがある（キットは動いている）
+    # 戻り値: (成功したペアのリスト, 隔離したペアのリスト, Perl スクリプトの実行回数, 実行時間の合計 [秒],
+    #          キット全体の失敗なら Perl スクリプトの出力、それ以外は None)
+    journal = JobJournal(journal_path) if journal_path else None
+    try:
+        return align_batch(workspace, pl_script_path, batch, folder_a, folder_c, staging, quarantine_dir, journal,
+                           kit_verified)
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def align_batch(workspace, pl_script_path, batch, folder_a, folder_c, staging, quarantine_dir, journal,
+                kit_verified=False):
+    # Perl スクリプトが失敗したらバッチを二分して再実行し、原因のペアだけを隔離する
+    # 隔離は二分探索が終わってから行う。キットが動くことをまだ確認できておらず、どのペアも成功しなかった
+    # ときはキット側の問題とみなし、何も隔離せずに（ペアはフォルダーAに戻したまま queued で）返す
+    aligned, failed, totals = [], [], [0, 0.0]  # failed: (ペア, Perl の出力, Julius のログ)
+    try:
+        bisect_batch(workspace, pl_script_path, batch, folder_a, folder_c, staging, journal,
+                     aligned, failed, totals, kit_verified)
+    except KitFailure as e:
+        return aligned, [], totals[0], totals[1], e.output
+    if failed and not aligned and not kit_verified and len(batch) > 1:
+        return [], [], totals[0], totals[1], failed[-1][1]
+
+    for pair, output, log in failed:
+        print(f"Quarantined {pair[0]}: {output}")
+        quarantine_pair(pair, folder_a, quarantine_dir, staging, output, log)
+        if journal is not None:
+            journal.set_state([pair], 'failed', message=output[-1000:])
+    return aligned, [pair for pair, _, _ in failed], totals[0], totals[1], None
+
+
+def bisect_batch(workspace, pl_script_path, batch, folder_a, folder_c, staging, journal, aligned, failed, totals,
+                 kit_verified=False):
+    # 成功したペアは aligned に、単独でも失敗したペアは failed に追加する（totals = [実行回数, 実行時間]）
+    # 二分した両方が同じ出力で全滅し、まだどのペアも成功していなければ KitFailure を送出する
+    wav_dir = os.path.join(workspace, 'wav')
+
+    # バッチのファイルをワークスペースの./wavに置く
+    # 先に staged を記録しておけば、置いている途中で止まっても recover_workspaces がフォルダーAに戻せる
+    if journal is not None:
+        journal.set_state(batch, 'staged', workspace)
+    for wav_file, txt_file in batch:
+        stage_file(os.path.join(folder_a, wav_file), os.path.join(wav_dir, wav_file), staging)
+        stage_file(os.path.join(folder_a, txt_file), os.path.join(wav_dir, txt_file), staging)
+
+    # .pl スクリプトを実行
+    start = time.monotonic()
+    try:
+        subprocess.run(['perl', pl_script_path], cwd=workspace, check=True, text=True, capture_output=True)
+    except OSError as e:  # perl 自体が起動できない
+        unstage_batch(wav_dir, batch, folder_a, staging)
+        if journal is not None:
+            journal.set_state(batch, 'queued')
+        raise KitFailure(f"Could not run perl: {e}")
+    except subprocess.CalledProcessError as e:
+        totals[0] += 1
+        totals[1] += time.monotonic() - start
+        output = f"{e.stdout or ''}{e.stderr or ''}"
+        log = None
+        if len(batch) == 1:
+            log_file = os.path.join(wav_dir, f'{pair_stem(batch[0])}.log')
+            if os.path.exists(log_file):
+                with open(log_file, 'rb') as f:
+                    log = f.read()
+        unstage_batch(wav_dir, batch, folder_a, staging)
+        if journal is not None:
+            journal.set_state(batch, 'queued')
+        if len(batch) == 1:
+            failed.append((batch[0], output, log))
+            return
+
+        # 二分して再実行
+        failed_before = len(failed)
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            bisect_batch(workspace, pl_script_path, half, folder_a, folder_c, staging, journal,
+                         aligned, failed, totals, kit_verified)
+        outputs = {output for _, output, _ in failed[failed_before:]}
+        if not (aligned or kit_verified) and len(failed) - failed_before == len(batch) and len(outputs) == 1:
+            raise KitFailure(outputs.pop())
+        return
+    totals[0] += 1
+    totals[1] += time.monotonic() - start
+    if journal is not None:
+        journal.set_state(batch, 'aligned', workspace)
+
+    # ワークスペースのファイルをフォルダーCに移動
+    for file in os.listdir(wav_dir):
+        collect_file(os.path.join(wav_dir, file), folder_c)
+    if journal is not None:
+        journal.set_state(batch, 'collected', workspace)
+    aligned.extend(batch)
+
+
+def recover_workspaces(journal, workspaces, folder_a, folder_c):
+    # 前回の実行が途中で止まった場合の後始末
+    # - aligned: Julius は終わっているので、結果をそのままフォルダーCに集める
+    # - staged: ./wav を片付けて（フォルダーAに無い元ファイルは戻して）queued に戻す
+    #   （置いている途中で止まった場合も含む）
+    # 以前の実行で相対パスのまま記録されたワークスペースも同じものとして扱う
+    states = {stem: (state, ws and os.path.abspath(ws)) for stem, (state, ws) in journal.states().items()}
+    for workspace in workspaces:
+        wav_dir = os.path.join(workspace, 'wav')
+        aligned = {stem for stem, (state, ws) in states.items() if state == 'aligned' and ws == workspace}
+        staged = {stem for stem, (state, ws) in states.items() if state == 'staged' and ws == workspace}
+        if aligned:
+            pairs = [(f'{stem}.wav', f'{stem}.txt') for stem in aligned]
+            for file in os.listdir(wav_dir):
+                if os.path.splitext(file)[0] in aligned:
+                    collect_file(os.path.join(wav_dir, file), folder_c)
+            journal.set_state(pairs, 'collected', workspace)
+            print(f"Recovered {len(aligned)} aligned pairs from {workspace}.")
+        if staged:
+            # 対象の stem のファイルだけを片付ける（それ以外のファイルには触れない）
+            for file in os.listdir(wav_dir):
+                stem, ext = os.path.splitext(file)
+                if stem not in staged:
+                    continue
+                if ext in ('.wav', '.txt') and not os.path.exists(os.path.join(folder_a, file)):
+                    collect_file(os.path.join(wav_dir, file), folder_a)
+                else:
+                    os.remove(os.path.join(wav_dir, file))
+            journal.set_state([(f'{stem}.wav', f'{stem}.txt') for stem in staged], 'queued')
+            print(f"Re-queued {len(staged)} unfinished pairs from {workspace}.")
+
+
+def ignore_interrupt():
+    # ワーカー（と Perl スクリプト）は Ctrl+C を無視し、実行中のバッチを最後まで処理する
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def read_durations(folder_a, pairs):
+    # WAV のヘッダーだけを読んで長さ（秒）を求める。読めないファイルは 0 秒扱い
+    durations = {}
+    for wav_file, _ in pairs:
+        try:
+            durations[wav_file] = read_wav_header(os.path.join(folder_a, wav_file)).duration
+        except (OSError, struct.error, WavFormatError) as e:
+            print(f"Could not read WAV header of {wav_file}: {e}")
+            durations[wav_file] = 0.0
+    return durations
+
+
+class BatchScheduler:
+    # 実測した「処理時間 [秒] / 音声の長さ [秒]」から、1回の実行が target_seconds 前後になるようにバッチを作る
+    # 計測できるまでは batch_size 個ずつ。バッチの個数は min_batch_size 〜 max_batch_size に収める
+    def __init__(self, batch_size, target_seconds, min_batch_size=1, max_batch_size=1000, smoothing=0.3):
+        self.batch_size = batch_size
+        self.target_seconds = target_seconds
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.smoothing = smoothing
+        self.seconds_per_audio_second = None
+
+    def observe(self, elapsed, audio_seconds, runs):
+        # 二分探索で再実行したバッチは通常のコストを表さないので使わない
+        if runs != 1 or audio_seconds <= 0:
+            return
+        rate = elapsed / audio_seconds
+        if self.seconds_per_audio_second is None:
+            self.seconds_per_audio_second = rate
+        else:
+            self.seconds_per_audio_second += self.smoothing * (rate - self.seconds_per_audio_second)
+
+    def next_batch(self, queue, durations):
+        if self.seconds_per_audio_second is None:
+            return [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+
+        audio_budget = self.target_seconds / self.seconds_per_audio_second
+        batch, audio_seconds = [], 0.0
+        while queue and len(batch) < self.max_batch_size:
+            duration = durations[queue[0][0]]
+            if len(batch) >= self.min_batch_size and audio_seconds + duration > audio_budget:
+                break
+            batch.append(queue.popleft())
+            audio_seconds += duration
+        return batch
+
+
+class PairWatcher:
+    # フォルダーAを監視し、WAV と TXT の両方が書き終わったペアを返す
+    # inotify_simple があれば inotify (IN_CLOSE_WRITE / IN_MOVED_TO) で、なければポーリングで検出する
+    # ポーリングでは、サイズと更新時刻が変わらず settle_seconds 経ったファイルを書き終わったとみなす
+    def __init__(self, folder_a, known_stems=(), settle_seconds=2.0):
+        self.folder_a = folder_a
+        self.settle_seconds = settle_seconds
+        self.known = set(known_stems)  # キューに入れ済みの stem
+        self.complete = {}             # stem -> 書き終わった拡張子の set
+        self.seen = {}                 # ポーリング用: ファイル名 -> (サイズ, 更新時刻)
+        self.inotify = None
+        if INotify is not None:
+            try:
+                self.inotify = INotify()
+                self.inotify.add_watch(folder_a, flags.CLOSE_WRITE | flags.MOVED_TO)
+            except OSError:
+                self.inotify = None
+        if self.inotify is not None:
+            # 監視開始前に書き終わっていたファイルにはイベントが来ないので、ここで拾っておく
+            # 監視開始の直前まで書かれていたかもしれないファイルは、落ち着くまでポーリングで確認する
+            self._scan()
+
+    def poll(self, timeout):
+        # timeout 秒まで待って、新しく揃ったペアのリストを返す
+        if self.inotify is not None:
+            for event in self.inotify.read(timeout=int(timeout * 1000)):
+                self._mark(event.name)
+            if self.seen:
+                self._scan(self.seen)
+        else:
+            time.sleep(timeout)
+            self._scan()
+        return self._take_ready()
+
+    def _scan(self, names=None):
+        # names を指定すると、そのファイルだけを確認する（inotify で監視開始前からあったファイル）
+        now = time.time()
+        if names is None:
+            with os.scandir(self.folder_a) as entries:
+                files = [(entry.name, entry.stat()) for entry in entries if entry.is_file()]
+        else:
+            files = []
+            for name in list(names):
+                try:
+                    files.append((name, os.stat(os.path.join(self.folder_a, name))))
+                except FileNotFoundError:
+                    del self.seen[name]
+        for name, stat in files:
+            stem, ext = os.path.splitext(name)
+            if ext not in ('.wav', '.txt') or stem in self.known:
+                continue
+            previous = self.seen.get(name)
+            self.seen[name] = (stat.st_size, stat.st_mtime)
+            # inotify の初回確認では、十分古いファイルは前回の記録がなくても書き終わったとみなす
+            settled = previous == self.seen[name] or (self.inotify is not None and previous is None)
+            if settled and now - stat.st_mtime >= self.settle_seconds:
+                self._mark(name)
+
+    def _mark(self, name):
+        stem, ext = os.path.splitext(name)
+        if ext in ('.wav', '.txt') and stem not in self.known:
+            self.complete.setdefault(stem, set()).add(ext)
+            if self.inotify is not None:
+                self.seen.pop(name, None)
+
+    def _take_ready(self):
+        ready = sorted(stem for stem, exts in self.complete.items() if len(exts) == 2)
+        for stem in ready:
+            del self.complete[stem]
+            self.known.add(stem)
+            self.seen.pop(f'{stem}.wav', None)
+            self.seen.pop(f'{stem}.txt', None)
+        return [(f'{stem}.wav', f'{stem}.txt') for stem in ready]
+
+
+def process_files(folder_a, folder_b, folder_c, batch_size, pl_script_path, workers=1, remove_sources=False,
+                  staging='copy', quarantine_dir=None, target_batch_seconds=None, min_batch_size=1,
+                  max_batch_size=1000, watch=False, poll_interval=2.0, settle_seconds=2.0, journal_path=None,
+                  retry_failed=False):
+    # workers = 1 のときは folder_b をそのまま使い、2 以上のときはキットのコピーを並列に動かす
+    # remove_sources = True のときは処理済みのペアをフォルダーAから削除する
+    # staging: ワークスペースへの置き方 ('copy' / 'link' / 'move'、stage_file を参照)
+    # quarantine_dir: 失敗したペアとログの置き場所（既定はフォルダーCの横の *_quarantine）
+    # target_batch_seconds: 指定するとバッチサイズを実測に合わせて調整する（None なら batch_size 固定）
+    # watch = True のときはフォルダーAが空になっても終了せず、新しく届いたペアを処理し続ける（Ctrl+C で終了）
+    # journal_path: ペアごとの状態を記録する SQLite ファイル（既定はフォルダーCの横の *_journal.sqlite）
+    #               再実行すると collected / failed のペアは飛ばし、途中だったペアだけをやり直す
+    # retry_failed = True のときは、フォルダーAにある failed のペアもやり直す（キットを直した後など）
+    #               'move' では隔離フォルダーから戻されたペアしかフォルダーAにないので、常にやり直す
+    if quarantine_dir is None:
+        quarantine_dir = os.path.normpath(folder_c) + '_quarantine'
+    if journal_path is None:
+        journal_path = os.path.normpath(folder_c) + '_journal.sqlite'
+    if workers > 1:
+        workspaces = create_workspaces(folder_b, workers)
+    else:
+        workspaces = [folder_b]
+    # Perl の cwd になるので絶対パスにしておく（folder_b が相対パスでも動くように）
+    workspaces = [os.path.abspath(workspace) for workspace in workspaces]
+    scripts = [workspace_script(pl_script_path, folder_b, workspace) for workspace in workspaces]
+    for workspace in workspaces:
+        wav_dir = os.path.join(workspace, 'wav')
+        if not os.path.exists(wav_dir):
+            os.makedirs(wav_dir)
+    # ワーカーが結果を移す先なので、バッチを渡す前に作っておく
+    os.makedirs(folder_c, exist_ok=True)
+
+    journal = JobJournal(journal_path)
+    recover_workspaces(journal, workspaces, folder_a, folder_c)
+
+    queue = scan_pairs(folder_a)
+    young = set()
+    if watch:
+        # 書き込み中かもしれないペアはここではキューに入れず、ウォッチャーが書き終わりを確認してから渡す
+        now = time.time()
+        young = {pair_stem(pair) for pair in queue
+                 if any(now - os.stat(os.path.join(folder_a, file)).st_mtime < settle_seconds for file in pair)}
+        queue = deque(pair for pair in queue if pair_stem(pair) not in young)
+    journal.add(queue)
+    states = journal.states()
+    finished_states = ('collected',) if retry_failed or staging == 'move' else ('collected', 'failed')
+    finished = [pair for pair in queue if states[pair_stem(pair)][0] in finished_states]
+    queue = deque(pair for pair in queue if states[pair_stem(pair)][0] not in finished_states)
+    retried = [pair for pair in queue if states[pair_stem(pair)][0] == 'failed']
+    if retried:
+        journal.set_state(retried, 'queued')
+    print(f"Found {len(queue) + len(finished)} wav/txt pairs in folder A "
+          f"({len(finished)} already finished in the journal, {len(retried)} failed pairs retried).")
+    if remove_sources and staging != 'move':
+        # 前回、フォルダーCへ移した後で削除する前に止まった分
+        for wav_file, txt_file in finished:
+            if states[pair_stem((wav_file, txt_file))][0] == 'collected':
+                os.remove(os.path.join(folder_a, wav_file))
+                os.remove(os.path.join(folder_a, txt_file))
+
+    if target_batch_seconds:
+        # 長さの近いファイルが同じバッチに入るよう、長い順に並べ替える
+        durations = read_durations(folder_a, queue)
+        queue = deque(sorted(queue, key=lambda pair: durations[pair[0]], reverse=True))
+        scheduler = BatchScheduler(batch_size, target_batch_seconds, min_batch_size, max_batch_size)
+    else:
+        durations = None
+        scheduler = BatchScheduler(batch_size, None)
+    if retried:
+        # やり直すペアは最後に回し、先に他のペアでキットが動くことを確かめる
+        retried_stems = {pair_stem(pair) for pair in retried}
+        queue = deque(sorted(queue, key=lambda pair: pair_stem(pair) in retried_stems))
+
+    watcher = None
+    if watch:
+        # キューに入れたペアと終わったペア以外（書き込み中のペアや、やり直す failed のペア）は監視で拾う
+        known = {pair_stem(pair) for pair in queue}
+        known.update(stem for stem, (state, _) in states.items() if state in finished_states)
+        watcher = PairWatcher(folder_a, known, settle_seconds)
+        mode = 'inotify' if watcher.inotify is not None else 'polling'
+        print(f"Watching {folder_a} for new wav/txt pairs ({mode}). Press Ctrl+C to stop.")
+
+    free_slots = list(range(len(workspaces)))
+    running = {}        # future -> (ワークスペース番号, バッチ)
+    stopped = False
+    kit_verified = False  # 成功したバッチがあれば、以降の失敗はペア側の問題とみなす
+
+    with ProcessPoolExecutor(max_workers=len(workspaces), initializer=ignore_interrupt) as executor:
+        while True:
+            # 空いているワークスペースにバッチを割り当てる
+            while free_slots and queue and not stopped:
+                # バッチサイズ分のペアをキューから取り出す
+                batch = scheduler.next_batch(queue, durations)
+                slot = free_slots.pop()
+                future = executor.submit(run_batch, workspaces[slot], scripts[slot], batch, folder_a, folder_c,
+                                         staging, quarantine_dir, journal_path, kit_verified)
+                running[future] = (slot, batch)
+                print(f"Running Perl script on {len(batch)} pairs in {workspaces[slot]}")
+
+            if not running and (watcher is None or stopped):  # ファイルがなくなったら終了
+                print("No more files to process.")
+                break
+
+            if running:
+                done, _ = wait(running, timeout=poll_interval if watcher else None, return_when=FIRST_COMPLETED)
+            else:
+                done = set()
+            for future in done:
+                slot, batch = running.pop(future)
+                free_slots.append(slot)
+                aligned, quarantined, runs, elapsed, kit_failure = future.result()
+                kit_verified = kit_verified or bool(aligned)
+                if durations is not None:
+                    scheduler.observe(elapsed, sum(durations[wav_file] for wav_file, _ in batch), runs)
+                    print(f"Batch of {len(batch)} pairs took {elapsed:.1f}s "
+                          f"({scheduler.seconds_per_audio_second or 0:.3f}s per audio second).")
+                if quarantined:
+                    print(f"Quarantined {len(quarantined)} pairs to {quarantine_dir} after {runs} runs.")
+                if kit_failure is not None:
+                    # キット側の問題なので隔離はしない。未処理のペアはフォルダーAに残し（journal では queued）、
+                    # 実行中のバッチを待ってから終了する
+                    print(f"The Perl script failed for every pair tried ({runs} runs); "
+                          f"check the segmentation kit. The pairs were left in folder A. Stopping.\n{kit_failure}")
+                    stopped = True
+
+                print(f"Moved files from {workspaces[slot]}/wav to folder C.")
+
+                # フォルダーAから使用済みのファイルを削除（指定した場合のみ、'move' では移動済み）
+                if remove_sources and staging != 'move':
+                    for wav_file, txt_file in aligned:
+                        os.remove(os.path.join(folder_a, wav_file))
+                        os.remove(os.path.join(folder_a, txt_file))
+
+                print(f"Processed {len(aligned)} files. Moving to next batch...")
+
+            if watcher is not None and not stopped:
+                # 実行中のバッチがあれば待たずに確認し、なければ poll_interval 秒まで新しいペアを待つ
+                try:
+                    new_pairs = watcher.poll(0 if running else poll_interval)
+                except KeyboardInterrupt:
+                    print("Stopping after the running batches...")
+                    stopped = True
+                    continue
+                if new_pairs:
+                    print(f"Found {len(new_pairs)} new wav/txt pairs in folder A.")
+                    if durations is not None:
+                        durations.update(read_durations(folder_a, new_pairs))
+                    journal.add(new_pairs)
+                    queue.extend(new_pairs)
+
+    journal.close()
+
+
+if __name__ == '__main__':
+    # 設定
+    folder_a = "C:/Users/batt7/Desktop/sokuon_txt_wav/"
+    folder_b = "C:/Users/batt7/Documents/segmentation-kit-4.3.1/"
+    folder_c = "C:/Users/batt7/Desktop/sokuon_result/"
+    batch_size = 96
+    pl_script_path = "C:/Users/batt7/Documents/segmentation-kit-4.3.1/segment_julius.pl"
+    workers = 1  # 並列ワークスペース数（2 以上で segmentation-kit のコピーを同時実行）
+    remove_sources = False  # True で処理済みのペアをフォルダーAから削除（従来の動作）
+    staging = 'link'  # 'link' = ハードリンク / 'move' = リネーム / 'copy' = コピー
+    target_batch_seconds = None  # 例: 120 で1回の実行が約2分になるよう batch_size を調整（None で固定）
+    watch = False  # True でフォルダーAを監視し続け、届いたペアから順に処理する
+    retry_failed = False  # True で前回隔離した（failed の）ペアもやり直す
+    process_files(folder_a, folder_b, folder_c, batch_size, pl_script_path, workers, remove_sources, staging,
+                  target_batch_seconds=target_batch_seconds, min_batch_size=8, max_batch_size=512, watch=watch,
+                  retry_failed=retry_failed)
@@ -1,122 +1,460 @@
-import os
-import re
-
-class ExtentionException(Exception):
-    pass
-
-class EmptyLabelException(Exception):
-    pass
-
-class Segment:
-    def __init__(self, tStart, tEnd, label):
-        self.tStart = tStart
-        self.tEnd = tEnd
-        self.label = label
-
-    def __add__(self, other):
-        return Segment(self.tStart, other.tEnd, self.label + other.label)
-
-    def can_follow(self, other):
-        vowels = ['a', 'i', 'u', 'e', 'o', 'a:', 'i:', 'u:', 'e:', 'o:']
-        consonants = ['w', 'r', 't', 'y', 'p', 's', 'd', 'f', 'g', 'h', 'j',
-                      'k', 'z', 'c', 'b', 'n', 'm']
-        only_consonants = lambda x: all([c in consonants for c in x])
-        if only_consonants(other.label) and self.label in vowels:
-            return True
-        if only_consonants(other.label) and only_consonants(self.label):
-            return True
-        return False
-
-    def to_textgrid_lines(self, segmentIndex):
-        label = '' if self.label in ['silB', 'silE'] else self.label
-        return [f'        intervals [{segmentIndex}]:',
-                f'            xmin = {self.tStart} ',
-                f'            xmax = {self.tEnd} ',
-                f'            text = "{label}" ']
-
-
-class SegmentationLabel:
-    def __init__(self, segments, separatedByMora=False):
-        self.segments = segments
-        self.separatedByMora = separatedByMora
-
-    def by_moras(self):
-        if self.separatedByMora:
-            return self
-
-        moraSegments = []
-        curMoraSegment = None
-        for segment in self.segments:
-            if curMoraSegment is None:
-                curMoraSegment = segment
-            elif segment.can_follow(curMoraSegment):
-                curMoraSegment += segment
-            else:
-                moraSegments.append(curMoraSegment)
-                curMoraSegment = segment
-        if curMoraSegment:
-            moraSegments.append(curMoraSegment)
-        return SegmentationLabel(moraSegments, separatedByMora=True)
-
-    def to_textgrid(self, textgridFileName):
-        if not self.segments:
-            raise EmptyLabelException(f'No label data found in {textgridFileName}')
-        textgridLines = self._textgrid_headers()
-        for i, segment in enumerate(self.segments):
-            textgridLines.extend(segment.to_textgrid_lines(i + 1))
-        with open(textgridFileName, 'w') as f:
-            f.write('\n'.join(textgridLines))
-
-    def _textgrid_headers(self):
-        segmentKind = 'mora' if self.separatedByMora else 'phoneme'
-        return ['File type = "ooTextFile"',
-                'Object class = "TextGrid"',
-                ' ',
-                'xmin = 0 ',
-               f'xmax = {self.segments[-1].tEnd} ',
-                'tiers? <exists> ',
-                'size = 1 ',
-                'item []: ',
-                '    item [1]: ',
-                '        class = "IntervalTier" ',
-               f'        name = "{segmentKind}" ',
-                '        xmin = 0 ',
-               f'        xmax = {self.segments[-1].tEnd} ',
-               f'        intervals: size = {len(self.segments)} ']
-
-
-def read_lab(filename):
-    if not re.search(r'\.lab$', filename):
-        raise ExtentionException(f"{filename} is not a .lab file")
-    with open(filename, 'r') as f:
-        labeldata = [line.split() for line in f if line.strip()]
-        segments = [Segment(float(line[0]), float(line[1]), line[2])
-                    for line in labeldata]
-        return SegmentationLabel(segments)
-
-
-def process_lab_files(input_folder, output_folder, by_moras=False):
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    lab_files = [f for f in os.listdir(input_folder) if f.endswith('.lab')]
-
-    for lab_file in lab_files:
-        lab_path = os.path.join(input_folder, lab_file)
-        try:
-            label = read_lab(lab_path)
-            if by_moras:
-                label = label.by_moras()
-            textgrid_file = os.path.join(output_folder, lab_file.replace('.lab', '.TextGrid'))
-            label.to_textgrid(textgrid_file)
-            print(f"Processed: {lab_file} -> {textgrid_file}")
-        except (ExtentionException, EmptyLabelException) as e:
-            print(f"Skipping {lab_file}: {e}")
-
-
-if __name__ == '__main__':
-    input_folder = input("Enter input folder path: ").strip()
-    output_folder = input("Enter output folder path: ").strip()
-    by_moras = input("Segment by moras? (y/n): ").strip().lower() == 'y'
-
-    process_lab_files(input_folder, output_folder, by_moras)
+import os
+import re
+import sys
+import json
+import hashlib
+from array import array
+from itertools import compress, count
+from operator import add
+from concurrent.futures import ProcessPoolExecutor
+
+class ExtentionException(Exception):
+    pass
+
+class EmptyLabelException(Exception):
+    pass
+
+class TranscriptMismatchException(Exception):
+    pass
+
+JAPANESE_VOWELS = ['a', 'i', 'u', 'e', 'o', 'a:', 'i:', 'u:', 'e:', 'o:']
+JAPANESE_CONSONANTS = ['w', 'r', 't', 'y', 'p', 's', 'd', 'f', 'g', 'h', 'j',
+                       'k', 'z', 'c', 'b', 'n', 'm']
+PAUSE_LABELS = frozenset(['silB', 'silE', 'sp'])
+
+
+class MoraClassifier:
+    # Each phone label is mapped once to a class code:
+    #   'C' = consonant letters only (e.g. 'k', 'ky', 'sh', also 'sp'), 'V' = vowel, 'O' = anything else (silB, N, q, ...)
+    #   labels given as pauses are always 'O', so they form a mora of their own
+    # A phone joins the current mora exactly when the previous phone is 'C' and it is not 'O'
+    # (the mora is still a consonant onset only after a 'C'), so the state machine over the code
+    # string reduces to one regex substitution and the grouping needs no Python-level loop.
+    JOIN_PATTERN = re.compile(r'(?<=C)[CV]')
+    START_FLAGS = str.maketrans('CVO', '\x01\x01\x01')
+
+    def __init__(self, vowels=JAPANESE_VOWELS, consonants=JAPANESE_CONSONANTS, pauses=()):
+        self.vowels = frozenset(vowels)
+        self.consonants = frozenset(consonants)
+        self.pauses = frozenset(pauses)
+        self.codes = {}  # label -> class code, filled once per distinct label
+
+    def classify(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            if label in self.pauses:
+                code = 'O'
+            elif all(c in self.consonants for c in label):
+                code = 'C'
+            elif label in self.vowels:
+                code = 'V'
+            else:
+                code = 'O'
+            self.codes[label] = code
+        return code
+
+    def can_follow(self, label, previousLabel):
+        return self.classify(previousLabel) == 'C' and self.classify(label) != 'O'
+
+    def code_string(self, labels):
+        for label in set(labels).difference(self.codes):
+            self.classify(label)
+        return ''.join(map(self.codes.__getitem__, labels))
+
+    def mora_start_flags(self, labels):
+        """bytes with 1 for each phone that starts a mora and 0 for each phone joining the previous one."""
+        return self.JOIN_PATTERN.sub('\x00', self.code_string(labels)).translate(self.START_FLAGS).encode('latin-1')
+
+
+JAPANESE_MORAS = MoraClassifier()
+# by_words needs the pauses as moras of their own so they can fall between words
+# (with JAPANESE_MORAS 'sp' joins the following mora, as the mora tier always did)
+WORD_MORAS = MoraClassifier(pauses=PAUSE_LABELS)
+
+
+# Full-size kana each count as one mora (っ and ん included); small kana and the long-vowel
+# mark join the previous kana, as they do in the Julius phone sequence (e.g. きゃ = ky a, かー = k a:)
+SMALL_KANA = 'ぁぃぅぇぉゃゅょゎゕゖァィゥェォャュョヮヵヶ'
+MORA_KANA = frozenset(map(chr, [*range(0x3041, 0x3097), *range(0x30A1, 0x30FB)])).difference(SMALL_KANA)
+TIER_KINDS = ('phoneme', 'mora', 'words')
+
+
+def count_kana_moras(word):
+    return sum(1 for c in word if c in MORA_KANA)
+
+
+def label_can_follow(label, previousLabel):
+    return JAPANESE_MORAS.can_follow(label, previousLabel)
+
+
+def textgrid_interval_lines(segmentIndex, tStart, tEnd, label):
+    label = '' if label in ['silB', 'silE'] else label
+    return [f'        intervals [{segmentIndex}]:',
+            f'            xmin = {tStart} ',
+            f'            xmax = {tEnd} ',
+            f'            text = "{label}" ']
+
+
+SILENCE_LABELS = {'silB': '', 'silE': ''}
+
+# Praat "long" text format (kept byte-compatible with the previous line-by-line output)
+LONG_HEADER = ('File type = "ooTextFile"\n'
+               'Object class = "TextGrid"\n'
+               ' \n'
+               'xmin = 0 \n'
+               'xmax = {0} \n'
+               'tiers? <exists> \n'
+               'size = {1} \n'
+               'item []: ')
+LONG_TIER = ('\n    item [{0}]: '
+             '\n        class = "IntervalTier" '
+             '\n        name = "{1}" '
+             '\n        xmin = 0 '
+             '\n        xmax = {2} '
+             '\n        intervals: size = {3} ')
+LONG_INTERVAL = ('\n        intervals [{0}]:'
+                 '\n            xmin = {1} '
+                 '\n            xmax = {2} '
+                 '\n            text = "{3}" ')
+
+# Praat "short" text format: values only, one per line
+SHORT_HEADER = 'File type = "ooTextFile"\nObject class = "TextGrid"\n\n0\n{0}\n<exists>\n{1}'
+SHORT_TIER = '\n"IntervalTier"\n"{1}"\n0\n{2}\n{3}'
+SHORT_INTERVAL = '\n{1}\n{2}\n"{3}"'
+
+
+def format_times(starts, ends):
+    """Text of both time columns; in contiguous tiers each boundary is formatted only once."""
+    endTexts = list(map(repr, ends))
+    if len(starts) > 1 and starts[1:] == ends[:-1]:
+        return [repr(starts[0])] + endTexts[:-1], endTexts
+    return list(map(repr, starts)), endTexts
+
+
+def write_textgrid(f, tiers, xmax, textgridFormat='long'):
+    """
+    Stream interval tiers, given as (name, starts, ends, labels) columns, to an open text file.
+    Each interval is formatted by one str.format call straight into the file buffer.
+    """
+    if textgridFormat == 'long':
+        header, tierHeader, interval = LONG_HEADER, LONG_TIER, LONG_INTERVAL
+    elif textgridFormat == 'short':
+        header, tierHeader, interval = SHORT_HEADER, SHORT_TIER, SHORT_INTERVAL
+    else:
+        raise ValueError(f"Unknown TextGrid format: {textgridFormat} (use 'long' or 'short')")
+
+    f.write(header.format(xmax, len(tiers)))
+    for tierIndex, (name, starts, ends, labels) in enumerate(tiers, 1):
+        f.write(tierHeader.format(tierIndex, name, xmax, len(labels)))
+        startTexts, endTexts = format_times(starts, ends)
+        texts = map(SILENCE_LABELS.get, labels, labels)
+        f.writelines(map(interval.format, count(1), startTexts, endTexts, texts))
+    if textgridFormat == 'short':
+        f.write('\n')
+
+
+class Segment:
+    __slots__ = ('tStart', 'tEnd', 'label')
+
+    def __init__(self, tStart, tEnd, label):
+        self.tStart = tStart
+        self.tEnd = tEnd
+        self.label = label
+
+    def __add__(self, other):
+        return Segment(self.tStart, other.tEnd, self.label + other.label)
+
+    def can_follow(self, other):
+        return label_can_follow(self.label, other.label)
+
+    def to_textgrid_lines(self, segmentIndex):
+        return textgrid_interval_lines(segmentIndex, self.tStart, self.tEnd, self.label)
+
+
+class SegmentationLabel:
+    # Column-oriented: float64 start/end arrays and a list of interned labels
+    # instead of one Segment object per line, so corpus-scale label sets fit in memory.
+    # Segment objects are only built on demand through the `segments` property.
+    __slots__ = ('starts', 'ends', 'labels', 'separatedByMora')
+
+    def __init__(self, segments=(), separatedByMora=False):
+        self.starts = array('d', [segment.tStart for segment in segments])
+        self.ends = array('d', [segment.tEnd for segment in segments])
+        self.labels = [sys.intern(segment.label) for segment in segments]
+        self.separatedByMora = separatedByMora
+
+    @classmethod
+    def from_columns(cls, starts, ends, labels, separatedByMora=False):
+        label = cls(separatedByMora=separatedByMora)
+        label.starts = starts if isinstance(starts, array) else array('d', starts)
+        label.ends = ends if isinstance(ends, array) else array('d', ends)
+        label.labels = list(map(sys.intern, labels))
+        return label
+
+    @property
+    def segments(self):
+        return [Segment(tStart, tEnd, label)
+                for tStart, tEnd, label in zip(self.starts, self.ends, self.labels)]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def by_moras(self, classifier=JAPANESE_MORAS):
+        if self.separatedByMora:
+            return self
+
+        flags = classifier.mora_start_flags(self.labels)
+        starts = array('d', compress(self.starts, flags))
+        ends = array('d', compress(self.ends, flags[1:] + b'\x01'))  # last phone before each mora start
+        # Mark every mora start with a NUL, concatenate all phones once and split into moras
+        marks = map(('', '\x00').__getitem__, flags)
+        labels = ''.join(map(add, marks, self.labels)).split('\x00')[1:]
+        return SegmentationLabel.from_columns(starts, ends, labels, separatedByMora=True)
+
+    def by_words(self, words, classifier=WORD_MORAS):
+        """
+        Word intervals for the kana words of a transcript: each word spans as many moras as it
+        has kana, and pauses (silB, silE, sp) between words become empty intervals.
+        """
+        moras = self.by_moras(classifier)
+        speech = [i for i, label in enumerate(moras.labels) if label not in PAUSE_LABELS]
+        words = [(word, count_kana_moras(word)) for word in words]
+        words = [(word, n) for word, n in words if n]  # drop punctuation-only tokens
+        transcriptMoras = sum(n for _, n in words)
+        if transcriptMoras != len(speech):
+            raise TranscriptMismatchException(
+                f'{len(speech)} moras in the lab but {transcriptMoras} in the transcript')
+
+        starts, ends, labels = array('d'), array('d'), []
+        nextMora = position = 0
+        for word, n in words:
+            first, last = speech[position], speech[position + n - 1]
+            if first > nextMora:  # pause before the word
+                starts.append(moras.starts[nextMora])
+                ends.append(moras.ends[first - 1])
+                labels.append('')
+            starts.append(moras.starts[first])
+            ends.append(moras.ends[last])
+            labels.append(word)
+            nextMora, position = last + 1, position + n
+        if nextMora < len(moras):
+            starts.append(moras.starts[nextMora])
+            ends.append(moras.ends[-1])
+            labels.append('')
+        return SegmentationLabel.from_columns(starts, ends, labels, separatedByMora=True)
+
+    def tier(self, name=None):
+        """(name, starts, ends, labels) columns as taken by write_textgrid."""
+        name = name or ('mora' if self.separatedByMora else 'phoneme')
+        return (name, self.starts, self.ends, self.labels)
+
+    def to_textgrid(self, textgridFileName, textgridFormat='long'):
+        write_textgrid_file(textgridFileName, [self.tier()], textgridFormat)
+
+
+def write_textgrid_file(textgridFileName, tiers, textgridFormat='long'):
+    if not tiers or not tiers[0][3]:
+        raise EmptyLabelException(f'No label data found in {textgridFileName}')
+    with open(textgridFileName, 'w', buffering=1 << 16) as f:
+        write_textgrid(f, tiers, tiers[0][2][-1], textgridFormat)
+
+
+def parse_lab_lines(text):
+    starts, ends, labels = array('d'), array('d'), []
+    for line in text.splitlines():
+        if line.strip():
+            fields = line.split()
+            starts.append(float(fields[0]))
+            ends.append(float(fields[1]))
+            labels.append(fields[2])
+    return starts, ends, labels
+
+
+def parse_lab(text):
+    """
+    Parse "start end label" lines into columns. The whole text is split once and the
+    numeric columns are converted with map(float) over strided slices; labs with extra
+    or missing fields on some line fall back to the line-by-line parser.
+    """
+    fields = text.split()
+    if len(fields) % 3 == 0:
+        try:
+            return array('d', map(float, fields[0::3])), array('d', map(float, fields[1::3])), fields[2::3]
+        except ValueError:
+            pass
+    return parse_lab_lines(text)
+
+
+def read_lab(filename):
+    if not re.search(r'\.lab$', filename):
+        raise ExtentionException(f"{filename} is not a .lab file")
+    with open(filename, 'r') as f:
+        text = f.read()
+    return SegmentationLabel.from_columns(*parse_lab(text))
+
+
+LAB_MANIFEST_NAME = 'lab_manifest.jsonl'
+
+
+def file_fingerprint(path, incremental):
+    """'stat': mtime and size, 'hash': SHA-1 of the contents."""
+    if incremental == 'hash':
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+
+def lab_key(lab_path, tier_kinds, incremental, textgrid_format='long', transcript_path=None):
+    """Fingerprint of a .lab file (and its transcript for a words tier) plus the tiers it is converted to."""
+    key = f"{'+'.join(tier_kinds)}/{textgrid_format}:{file_fingerprint(lab_path, incremental)}"
+    if 'words' in tier_kinds:
+        try:
+            key += f':{file_fingerprint(transcript_path, incremental)}'
+        except OSError:
+            key += ':missing'
+    return key
+
+
+def load_lab_manifest(manifest_path):
+    """Read the append-only manifest ({"file": lab name, "key": lab_key} per line); later lines win."""
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    manifest[entry['file']] = entry['key']
+                except (ValueError, KeyError, TypeError):
+                    continue  # line cut off by an interrupted run
+    return manifest
+
+
+def read_transcript(transcript_path):
+    """Whitespace-separated words of a transcript .txt (UTF-8, or EUC-JP as older kits expect)."""
+    with open(transcript_path, 'rb') as f:
+        data = f.read()
+    try:
+        return data.decode('utf-8').split()
+    except UnicodeDecodeError:
+        return data.decode('euc_jp').split()
+
+
+def build_tiers(label, tier_kinds, transcript_path=None):
+    """
+    All requested tiers from one parsed lab, in tier_kinds order.
+    Returns (tiers, note); note says why a words tier had to be left out.
+    """
+    tiers, note = [], None
+    for kind in tier_kinds:
+        if kind == 'phoneme':
+            tiers.append(label.tier('phoneme'))
+        elif kind == 'mora':
+            tiers.append(label.by_moras().tier('mora'))
+        elif kind == 'words':
+            try:
+                tiers.append(label.by_words(read_transcript(transcript_path)).tier('words'))
+            except (OSError, TypeError, UnicodeDecodeError, TranscriptMismatchException) as e:
+                note = f'no words tier: {e}'
+        else:
+            raise ValueError(f"Unknown tier kind: {kind} (use {', '.join(TIER_KINDS)})")
+    if not tiers and note:
+        raise TranscriptMismatchException(note)
+    return tiers, note
+
+
+def convert_lab(lab_path, textgrid_file, tier_kinds=('phoneme',), textgrid_format='long', transcript_path=None):
+    tiers, note = build_tiers(read_lab(lab_path), tier_kinds, transcript_path)
+    write_textgrid_file(textgrid_file, tiers, textgrid_format)
+    return note
+
+
+def convert_lab_chunk(tasks):
+    """Convert a list of convert_lab argument tuples; returns (error, note) per task."""
+    results = []
+    for task in tasks:
+        try:
+            results.append((None, convert_lab(*task)))
+        except (ExtentionException, EmptyLabelException, TranscriptMismatchException,
+                ValueError, IndexError, OSError) as e:
+            results.append((str(e) or type(e).__name__, None))
+    return results
+
+
+def process_lab_files(input_folder, output_folder, by_moras=False, workers=1, chunk_size=200, incremental=None,
+                      textgrid_format='long', tiers=None, transcript_folder=None):
+    """
+    Convert every .lab in input_folder to a TextGrid in output_folder.
+    workers > 1 hands chunks of chunk_size files to a process pool.
+    incremental='stat' (mtime + size) or 'hash' (SHA-1 of the contents) skips labs whose
+    fingerprint matches the manifest in output_folder and whose TextGrid still exists.
+    textgrid_format is 'long' or 'short' (Praat text formats).
+    tiers lists the tiers to write into each TextGrid from a single parse, e.g. ('phoneme', 'mora', 'words');
+    the default is the one tier selected by by_moras. The words tier reads <stem>.txt from
+    transcript_folder (default: input_folder).
+    """
+    tier_kinds = tuple(tiers) if tiers else (('mora',) if by_moras else ('phoneme',))
+    transcript_folder = transcript_folder or input_folder
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    manifest_path = os.path.join(output_folder, LAB_MANIFEST_NAME)
+    manifest = load_lab_manifest(manifest_path) if incremental else {}
+    existing = set(os.listdir(output_folder)) if incremental else set()
+
+    tasks, names, keys = [], [], []
+    skipped = 0
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.lab'):
+                continue
+            textgrid_name = entry.name.replace('.lab', '.TextGrid')
+            transcript_path = os.path.join(transcript_folder, entry.name[:-len('.lab')] + '.txt')
+            key = lab_key(entry.path, tier_kinds, incremental, textgrid_format, transcript_path) if incremental else None
+            if incremental and manifest.get(entry.name) == key and textgrid_name in existing:
+                skipped += 1
+                continue
+            tasks.append((entry.path, os.path.join(output_folder, textgrid_name), tier_kinds, textgrid_format,
+                          transcript_path))
+            names.append(entry.name)
+            keys.append(key)
+
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(chunks) > 1 else None
+    manifest_file = open(manifest_path, 'a', encoding='utf-8') if incremental else None
+    try:
+        results = executor.map(convert_lab_chunk, chunks) if executor else map(convert_lab_chunk, chunks)
+        position = 0
+        for chunk, errors in zip(chunks, results):
+            for (_, textgrid_file, *_), (error, note) in zip(chunk, errors):
+                lab_file = names[position]
+                if error is None:
+                    print(f"Processed: {lab_file} -> {textgrid_file}" + (f" ({note})" if note else ""))
+                    if manifest_file:
+                        manifest_file.write(json.dumps({'file': lab_file, 'key': keys[position]}) + '\n')
+                else:
+                    print(f"Skipping {lab_file}: {error}")
+                position += 1
+            if manifest_file:
+                manifest_file.flush()
+    finally:
+        if manifest_file:
+            manifest_file.close()
+        if executor is not None:
+            executor.shutdown()
+
+    if skipped:
+        print(f"Up to date: {skipped} file(s)")
+
+
+if __name__ == '__main__':
+    input_folder = input("Enter input folder path: ").strip()
+    output_folder = input("Enter output folder path: ").strip()
+    tiers = input("Tiers to write, comma separated (phoneme, mora, words) [phoneme]: ").strip() or 'phoneme'
+    tiers = [tier.strip() for tier in tiers.split(',') if tier.strip()]
+    incremental = 'stat' if input("Skip labs already converted? (y/n): ").strip().lower() == 'y' else None
+    workers = int(input("Number of worker processes [1]: ").strip() or 1)
+    textgrid_format = 'short' if input("Write short TextGrid format? (y/n): ").strip().lower() == 'y' else 'long'
+
+    process_lab_files(input_folder, output_folder, workers=workers, incremental=incremental,
+                      textgrid_format=textgrid_format, tiers=tiers)
@@ -1,5 +1,5 @@
 import os
-from praatio import textgrid
+from TextGridCodec import read_textgrid, save_textgrid, IntervalTier
 
 # 入力ディレクトリと出力ディレクトリを指定
 input_dir = '/Users'  # TextGridファイルが保存されているフォルダ
@@ -11,30 +11,29 @@ os.makedirs(output_dir, exist_ok=True)
 
 # 新しいInterval Tierを作成する関数
 def add_targetword_tier_at_bottom(textgrid_path, output_path):
-    # TextGridファイルを読み込む
-    tg = textgrid.openTextgrid(textgrid_path, includeEmptyIntervals=True)
+    # TextGridファイルを読み込む (ヘッダーのみ解析し、既存Tierの中身はそのまま書き戻す)
+    tg = read_textgrid(textgrid_path)
     
     # TextGridの最小・最大時間を取得
-    min_time = tg.minTimestamp
-    max_time = tg.maxTimestamp
+    min_time = tg.min_time
+    max_time = tg.max_time
 
     # 新しいTierの名前
     new_tier_name = "TargetWord"
 
     # Tierがすでに存在しているかを確認
-    tier_names = [tier.name for tier in tg.tiers]
-    if new_tier_name in tier_names:
+    if new_tier_name in tg.tier_names:
         print(f"Tier '{new_tier_name}' already exists in {textgrid_path}. Skipping.")
         return
 
     # 新しいTierを作成 (例: 空のインターバルを1つ含む)
-    new_tier = textgrid.IntervalTier(new_tier_name, [(min_time, max_time, "")], minT=min_time, maxT=max_time)
+    new_tier = IntervalTier(new_tier_name, [(min_time, max_time, "")], min_time=min_time, max_time=max_time)
 
     # TextGridに新しいTierを追加
-    tg.addTier(new_tier)
+    tg.add_tier(new_tier)
 
     # 更新されたTextGridを保存
-    tg.save(output_path, format="short_textgrid", includeBlankSpaces=True)
+    save_textgrid(tg, output_path, "short")
     print(f"Updated TextGrid saved: {output_path}")
 
 # 全てのTextGridファイルに適用
@@ -1,7 +1,8 @@
 # Tierに指定のキーワードがあれば、あらたにTargetWordのTierにそのまま移す
 
 import os
-from praatio import textgrid
+from TextGridCodec import read_textgrid, save_textgrid, IntervalTier
+from KeywordMatcher import KeywordMatcher
 
 # 入力ディレクトリと出力ディレクトリを指定
 input_dir = '/Users'  # TextGridファイルが保存されているフォルダ
@@ -16,31 +17,31 @@ keywords = [
     "go", "flow", "float", "teacher"
 ]
 
+# キーワードファイル (1行に1語またはフレーズ、#以降はコメント)。Noneなら上のリストを使う
+keyword_file = None
+
+# 大文字・小文字と記号を無視して照合し、複数語のフレーズは隣接するインターバルにまたがって探す
+matcher = KeywordMatcher.from_file(keyword_file) if keyword_file else KeywordMatcher(keywords)
+
 # 出力ディレクトリが存在しない場合は作成
 os.makedirs(output_dir, exist_ok=True)
 
 # 新しいTargetWord Tierを作成する関数
 def add_targetword_tier_with_keywords(textgrid_path, output_path):
-    # TextGridファイルを読み込む
-    tg = textgrid.openTextgrid(textgrid_path, includeEmptyIntervals=True)
+    # TextGridファイルを読み込む (中身を解析するのはwords Tierだけ)
+    tg = read_textgrid(textgrid_path)
     
     # words Tierを取得
     words_tier = None
-    for tier in tg.tiers:
-        if tier.name == "words":  # Tier名を"words"に変更
-            words_tier = tier
-            break
+    if "words" in tg.tier_names:  # Tier名を"words"に変更
+        words_tier = tg.get_tier("words")
 
     if words_tier is None:
         print(f"words Tier not found in {textgrid_path}. Skipping.")
         return
 
-    # キーワードに一致するインターバルを収集
-    target_intervals = [
-        (start, end, label)
-        for start, end, label in words_tier.entries
-        if label in keywords
-    ]
+    # キーワードに一致するインターバルを収集 (Tierを1回走査するだけ)
+    target_intervals = matcher.match_intervals(words_tier.entries)
 
     if not target_intervals:
         print(f"No keywords found in {textgrid_path}. Skipping.")
@@ -48,19 +49,19 @@ def add_targetword_tier_with_keywords(textgrid_path, output_path):
 
     # 新しいTargetWord Tierを作成
     new_tier_name = "TargetWord"
-    new_tier = textgrid.IntervalTier(new_tier_name, target_intervals, minT=tg.minTimestamp, maxT=tg.maxTimestamp)
+    new_tier = IntervalTier(new_tier_name, target_intervals, min_time=tg.min_time, max_time=tg.max_time)
 
     # 既存のTargetWord Tierを削除（もし存在する場合）
     try:
-        tg.removeTier(new_tier_name)
+        tg.remove_tier(new_tier_name)
     except KeyError:
         pass  # Tierが存在しない場合は何もしない
 
     # 新しいTierをTextGridに追加
-    tg.addTier(new_tier)
+    tg.add_tier(new_tier)
 
     # 更新されたTextGridを保存
-    tg.save(output_path, format="short_textgrid", includeBlankSpaces=True)
+    save_textgrid(tg, output_path, "short")
     print(f"Updated TextGrid saved: {output_path}")
 
 # 全てのTextGridファイルに適用
@@ -0,0 +1,275 @@
+# Headless engine behind 01GUI_AutomaticBASE64ConverterByTSV.py.
+# Converts the Base64-encoded recordings in a jsPsych TSV/CSV export into WAV files
+# (optionally 16kHz mono), plus file_list.csv and UTF-8 TXT files, without Qt.
+#
+# Usage (e.g. on a server or from cron):
+#   python Base64ToWavEngine.py export.tsv --base64-column response --name-columns subject item \
+#       --resample --workers 8 --file-list --txt -o /data/output
+
+import os
+import sys
+import time
+import json
+import base64
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from ffmpy import FFmpeg
+from WavTools import convert_wav
+
+
+def get_separator(file_path):
+    """Return the field separator for a TSV/CSV file."""
+    if file_path.endswith(".tsv"):
+        return "\t"
+    elif file_path.endswith(".csv"):
+        return ","
+    raise ValueError("Unsupported file format! Please select a TSV or CSV file.")
+
+
+def count_data_rows(file_path, chunk_size=100000):
+    """
+    Count the data rows with the same CSV parser as the conversion, so quoted fields
+    with embedded newlines (common in jsPsych exports) are not counted as extra rows.
+    Only the first column is kept, which keeps memory flat.
+    """
+    chunks = pd.read_csv(file_path, sep=get_separator(file_path), usecols=[0], dtype=str, chunksize=chunk_size)
+    return sum(len(chunk) for chunk in chunks)
+
+
+MANIFEST_NAME = "conversion_manifest.jsonl"
+
+
+def conversion_key(payload, to_16k_mono, resampler):
+    """Hash of a Base64 payload plus the settings that change the WAV it produces."""
+    settings = f"16k_mono={to_16k_mono};resampler={resampler if to_16k_mono else ''}"
+    digest = hashlib.sha1(settings.encode("utf-8"))
+    digest.update(str(payload).strip().rstrip("=").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """
+    Read the append-only conversion manifest ({"file": wav name, "key": conversion_key} per line).
+    Later lines win, and a line cut off by an interrupted run is ignored.
+    """
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    manifest[entry["file"]] = entry["key"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return manifest
+
+
+def convert_row(task):
+    """
+    Decode one Base64 recording and convert it to WAV.
+    The decoded bytes are piped to a single FFmpeg call that writes the final format
+    (resampling and downmix included), so nothing touches the disk except the WAV
+    and, if requested, the original WebM. With the "numpy" resampler FFmpeg only decodes
+    to pcm_f32le and WavTools does the 16kHz mono conversion in this process.
+    Runs in the GUI process or in a worker process, so it only takes picklable arguments.
+    Returns (wav file name, None) on success or (None, error message) on failure.
+    """
+    file_base, payload, wav_dir, to_16k_mono, keep_webm, resampler = task
+    try:
+        wav_file = os.path.join(wav_dir, f"{file_base}.wav")
+
+        # Decode Base64 to WebM
+        s = str(payload).strip()
+        s += '=' * (-len(s) % 4)  # Padding Base64 string
+        decoded_data = base64.b64decode(s)
+        if keep_webm:
+            with open(os.path.join(wav_dir, f"{file_base}.webm"), 'wb') as f:
+                f.write(decoded_data)
+
+        # Convert WebM from stdin to WAV using FFmpeg (16kHz mono in the same pass if checked)
+        ffmpeg_resamples = to_16k_mono and resampler == "ffmpeg"
+        output_options = '-ar 16000 -ac 1' if ffmpeg_resamples else '-c:a pcm_f32le'
+        ff = FFmpeg(
+            global_options='-y',
+            inputs={'pipe:0': None},
+            outputs={wav_file: output_options}
+        )
+        ff.run(input_data=decoded_data)
+
+        if to_16k_mono and not ffmpeg_resamples:
+            convert_wav(wav_file, target_rate=16000, sample_format='pcm16')
+
+        return f"{file_base}.wav", None
+    except Exception as e:
+        return None, str(e)
+
+
+def read_columns(file_path):
+    """Read only the header row of a TSV/CSV export."""
+    return list(pd.read_csv(file_path, sep=get_separator(file_path), nrows=0).columns)
+
+
+def convert_export(file_path, base64_col, output_dir, naming_columns=(), content_col=None,
+                   include_index=True, to_16k_mono=False, resampler="ffmpeg", keep_webm=False,
+                   chunk_size=100, workers=1, file_list=False, write_txt=False, resume=True,
+                   on_progress=None, on_failure=None, should_cancel=None):
+    """
+    Convert every row of a TSV/CSV export and return (converted, skipped, failed, cancelled).
+    - chunk_size: rows read at a time (None reads the whole file at once)
+    - workers: number of worker processes (1 converts in this process)
+    - on_progress(done, total, rows_per_second, eta_seconds) and on_failure(index, message)
+      are called for each row; should_cancel() is checked after each chunk
+    """
+    sep = get_separator(file_path)
+    naming_columns = list(naming_columns)
+
+    # Ensure the wav and txt directories exist
+    wav_dir = os.path.join(output_dir, "wav")
+    txt_dir = os.path.join(output_dir, "txt")
+    os.makedirs(wav_dir, exist_ok=True)
+    os.makedirs(txt_dir, exist_ok=True)
+
+    # Read only the columns we need; in streaming mode peak memory depends on the chunk size
+    usecols = [col for col in read_columns(file_path)
+               if col == base64_col or col in naming_columns or col == content_col]
+    if chunk_size:
+        total_rows = count_data_rows(file_path)
+        chunks = pd.read_csv(file_path, sep=sep, usecols=usecols, dtype=str, chunksize=chunk_size)
+    else:
+        df = pd.read_csv(file_path, sep=sep, usecols=usecols, dtype=str)
+        total_rows = len(df)
+        chunks = [df]
+
+    # Rows whose WAV already exists with a matching payload/settings hash are skipped;
+    # every finished row is appended to the manifest, so an interrupted run resumes here
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path) if resume else {}
+    manifest_file = open(manifest_path, "a", encoding="utf-8")
+
+    converted_files = []  # Store successfully converted file names
+    content_values = []   # Store content values if applicable
+    done = skipped = failed = 0
+    cancelled = False
+    start_time = time.monotonic()
+
+    # With more than one worker the rows of each chunk are converted in a process pool;
+    # map() yields results in submission order, so names and file_list.csv match the serial path
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        for chunk in chunks:
+            tasks, rows = [], []
+            pending = set()  # row positions in this chunk that need converting
+            for index, row in chunk.iterrows():
+                try:
+                    # Generate file name using selected columns
+                    file_base = "_".join([str(row[col]) for col in naming_columns])
+                    if include_index:
+                        file_base += f"_index{index}"  # Add index if checkbox is checked
+                    # If content column is selected, store content values
+                    content = row[content_col] if content_col is not None else ""  # Empty content
+                except Exception as e:
+                    done += 1
+                    failed += 1
+                    if on_failure:
+                        on_failure(index, str(e))
+                    continue
+                payload = row[base64_col]
+                key = conversion_key(payload, to_16k_mono, resampler)
+                wav_name = f"{file_base}.wav"
+                if manifest.get(wav_name) != key or not os.path.exists(os.path.join(wav_dir, wav_name)):
+                    pending.add(len(rows))
+                    tasks.append((file_base, payload, wav_dir, to_16k_mono, keep_webm, resampler))
+                rows.append((index, content, wav_name, key))
+
+            results = executor.map(convert_row, tasks) if executor else map(convert_row, tasks)
+            for position, (index, content, wav_name, key) in enumerate(rows):
+                done += 1
+                if position not in pending:
+                    skipped += 1
+                    error = None
+                else:
+                    _, error = next(results)
+                    if error is None:
+                        manifest_file.write(json.dumps({"file": wav_name, "key": key}) + "\n")
+                        manifest_file.flush()
+
+                if error is not None:
+                    failed += 1
+                    if on_failure:
+                        on_failure(index, error)
+                else:
+                    # Add to converted (or already up-to-date) files list
+                    converted_files.append(wav_name)
+                    content_values.append(content)
+
+                if on_progress:
+                    # keep the total at least done, so a row count that was off never shows more than 100%
+                    total_rows = max(total_rows, done)
+                    rate = done / max(time.monotonic() - start_time, 1e-9)
+                    on_progress(done, total_rows, rate, (total_rows - done) / rate)
+
+            if should_cancel and should_cancel():
+                cancelled = True
+                break
+    finally:
+        manifest_file.close()
+        if executor is not None:
+            executor.shutdown()
+
+    # Generate file list (also after a cancel, for the rows already converted)
+    file_list_df = pd.DataFrame({"filename": converted_files, "content": content_values})
+    if file_list:
+        file_list_df.to_csv(os.path.join(output_dir, "file_list.csv"), index=False)
+
+    # Generate TXT files
+    if write_txt:
+        for fname, content in zip(file_list_df["filename"], file_list_df["content"]):
+            txt_file = os.path.join(txt_dir, f"{os.path.splitext(fname)[0]}.txt")
+            with open(txt_file, "w", encoding="utf-8") as f:
+                f.write(str(content) if pd.notna(content) else "")
+
+    return len(converted_files) - skipped, skipped, failed, cancelled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Base64-encoded recordings in a TSV/CSV export into WAV files.")
+    parser.add_argument("input", help="TSV/CSV export (e.g. from jsPsych)")
+    parser.add_argument("--base64-column", required=True, help="column containing the Base64 recordings")
+    parser.add_argument("--name-columns", nargs="*", default=[], help="columns joined with '_' for the file names")
+    parser.add_argument("--no-index", action="store_true", help="do not append _index<row> to the file names")
+    parser.add_argument("--content-column", help="column written into file_list.csv / TXT files")
+    parser.add_argument("--resample", action="store_true", help="convert WAV to 16kHz mono")
+    parser.add_argument("--resampler", choices=["ffmpeg", "numpy"], default="ffmpeg",
+                        help="engine for the 16kHz mono conversion (default: ffmpeg)")
+    parser.add_argument("--keep-webm", action="store_true", help="keep the decoded WebM files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="rows read at a time (0 = whole file)")
+    parser.add_argument("--file-list", action="store_true", help="write file_list.csv")
+    parser.add_argument("--txt", action="store_true", help="write a UTF-8 TXT file per WAV")
+    parser.add_argument("--no-resume", action="store_true", help="reconvert rows already in the manifest")
+    parser.add_argument("-o", "--output-dir", required=True, help="output folder (wav/ and txt/ are created in it)")
+    args = parser.parse_args()
+
+    def print_progress(done, total, rate, eta):
+        if done % 100 == 0 or done == total:
+            print(f"{done}/{total} rows - {rate:.1f} rows/s - ETA {int(eta)}s", flush=True)
+
+    def print_failure(index, message):
+        print(f"Error processing row {index}: {message}", file=sys.stderr, flush=True)
+
+    converted, skipped, failed, _ = convert_export(
+        args.input, args.base64_column, args.output_dir,
+        naming_columns=args.name_columns, content_col=args.content_column,
+        include_index=not args.no_index, to_16k_mono=args.resample, resampler=args.resampler,
+        keep_webm=args.keep_webm, chunk_size=args.chunk_size or None, workers=max(args.workers, 1),
+        file_list=args.file_list, write_txt=args.txt, resume=not args.no_resume,
+        on_progress=print_progress, on_failure=print_failure)
+    print(f"{converted} files converted, {skipped} already up to date, {failed} rows failed.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
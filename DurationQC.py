@@ -0,0 +1,143 @@
+# Quick QC of alignment outputs: compare each WAV's duration with its TextGrid / .lab by stem.
+# - WAV duration from the RIFF header only (WavHeader.read_wav_header, no audio decoding)
+# - TextGrid duration from the xmax in its file header, .lab duration from the end time of its last line
+# - reports duration mismatches, empty labels (no tiers / no lab lines), unreadable files and
+#   files whose partner is missing; files are checked in a thread pool
+#
+# Usage: python DurationQC.py wav_folder [label_folder] [--tolerance 0.1] [--report qc.tsv] [--workers 32]
+
+import os
+import sys
+import struct
+import argparse
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from WavHeader import read_wav_header, WavFormatError
+from TextGridCodec import read_textgrid_header, TextGridFormatError
+
+# EmptyLabelException is the same one 03_LabToTextGrid_AssignFolder.py raises for labs without data
+lab_converter = importlib.import_module('03_LabToTextGrid_AssignFolder')
+
+LABEL_EXTENSIONS = ('.TextGrid', '.lab')
+
+
+def read_lab_end(path, tail_size=4096):
+    """End time of the last segment of a .lab, read from the tail of the file."""
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - tail_size, 0))
+        lines = f.read().splitlines()
+    if size > tail_size:
+        lines = lines[1:]  # the first line of the tail may be cut off
+    for line in reversed(lines):
+        fields = line.split()
+        if fields:
+            return float(fields[1])
+    if size > tail_size:  # only blank lines in the tail: look at the whole file
+        return read_lab_end(path, size)
+    raise lab_converter.EmptyLabelException(f'No label data found in {path}')
+
+
+def label_duration(path):
+    if path.endswith('.lab'):
+        return read_lab_end(path)
+    _, xmax, tier_count = read_textgrid_header(path)
+    if tier_count == 0:
+        raise lab_converter.EmptyLabelException(f'No tiers found in {path}')
+    return xmax
+
+
+def scan_stems(folder, extensions):
+    """stem -> {extension: path} for the files of folder with one of the extensions."""
+    stems = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            stem, dot, ext = entry.name.rpartition('.')
+            if dot and '.' + ext in extensions:
+                stems.setdefault(stem, {})['.' + ext] = entry.path
+    return stems
+
+
+def check_stem(task):
+    """
+    QC rows (stem, file, problem, wav_duration, label_duration, detail) for one stem;
+    an empty list means everything matched.
+    """
+    stem, wav_path, label_paths, tolerance = task
+    if wav_path is None:
+        return [(stem, path, 'missing_wav', None, None, '') for path in label_paths]
+    rows = []
+    wav_duration = None
+    try:
+        wav_duration = read_wav_header(wav_path).duration
+    except (OSError, struct.error, WavFormatError) as e:
+        # the labels are still checked, so their problems show up in the same pass
+        rows.append((stem, wav_path, 'unreadable_wav', None, None, str(e)))
+    if not label_paths:
+        rows.append((stem, wav_path, 'missing_label', wav_duration, None, ''))
+        return rows
+
+    for path in label_paths:
+        try:
+            duration = label_duration(path)
+        except lab_converter.EmptyLabelException as e:
+            rows.append((stem, path, 'empty_label', wav_duration, None, str(e)))
+            continue
+        except (OSError, ValueError, IndexError, TextGridFormatError) as e:
+            rows.append((stem, path, 'unreadable_label', wav_duration, None, f"{type(e).__name__}: {e}"))
+            continue
+        if wav_duration is not None and abs(duration - wav_duration) > tolerance:
+            rows.append((stem, path, 'duration_mismatch', wav_duration, duration,
+                         f"difference {duration - wav_duration:+.3f}s"))
+    return rows
+
+
+def check_chunk(tasks):
+    return [row for task in tasks for row in check_stem(task)]
+
+
+def check_folders(wav_folder, label_folder=None, tolerance=0.1, workers=32, chunk_size=256):
+    """Run check_stem over every stem found in either folder; returns the problem rows and the stem count."""
+    wavs = scan_stems(wav_folder, ('.wav',))
+    labels = scan_stems(label_folder or wav_folder, LABEL_EXTENSIONS)
+    tasks = [(stem, wavs.get(stem, {}).get('.wav'),
+              [labels[stem][ext] for ext in LABEL_EXTENSIONS if ext in labels.get(stem, {})], tolerance)
+             for stem in sorted(wavs.keys() | labels.keys())]
+    # Stems go to the threads in chunks so the per-task executor overhead does not dominate
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    rows = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_rows in executor.map(check_chunk, chunks):
+            rows.extend(chunk_rows)
+    return rows, len(tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare WAV durations with their TextGrid/.lab files by stem.")
+    parser.add_argument('wav_folder', help="folder containing the WAV files")
+    parser.add_argument('label_folder', nargs='?', help="folder containing .TextGrid/.lab files (default: wav_folder)")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="allowed duration difference in seconds (default: 0.1)")
+    parser.add_argument('--report', help="write the problems as TSV here (default: stdout)")
+    parser.add_argument('--workers', type=int, default=32, help="threads (default: 32)")
+    args = parser.parse_args()
+
+    rows, checked = check_folders(args.wav_folder, args.label_folder, args.tolerance, args.workers)
+    out = open(args.report, 'w', encoding='utf-8') if args.report else sys.stdout
+    try:
+        out.write('stem\tfile\tproblem\twav_duration\tlabel_duration\tdetail\n')
+        for row in rows:
+            out.write('\t'.join('' if value is None else str(value) for value in row) + '\n')
+    finally:
+        if args.report:
+            out.close()
+
+    counts = {}
+    for row in rows:
+        counts[row[2]] = counts.get(row[2], 0) + 1
+    summary = ', '.join(f"{problem} {count}" for problem, count in sorted(counts.items())) or 'no problems'
+    print(f"Checked {checked} stems: {summary}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# Export every interval of a TextGrid (or Julius .lab) corpus into one table for statistics.
+# - files are read in parallel in chunks; each chunk comes back as contiguous columns
+# - the columns are concatenated once into a DataFrame (file and tier as categoricals)
+#   and written in one go: .parquet (needs pyarrow or fastparquet), .tsv or .csv
+# - columns: file, tier, start, end, duration, label
+#
+# Usage: python IntervalExporter.py textgrids intervals.parquet [--tiers words phones] [--workers 8]
+#        python IntervalExporter.py labs intervals.tsv --lab-tiers phoneme mora
+
+import os
+import sys
+import argparse
+import importlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from TextGridCodec import read_textgrid, TextGridFormatError, IntervalTier
+
+# .lab files are converted with the same code as 03_LabToTextGrid_AssignFolder.py
+lab_converter = importlib.import_module('03_LabToTextGrid_AssignFolder')
+
+
+def read_tiers(path, tiers=None, lab_tiers=('phoneme',)):
+    """(name, starts, ends, labels) for each interval tier of a TextGrid or .lab file."""
+    if path.endswith('.lab'):
+        transcript_path = path[:-len('.lab')] + '.txt'
+        columns, _ = lab_converter.build_tiers(lab_converter.read_lab(path), lab_tiers, transcript_path)
+        # silB/silE are written as empty intervals in the TextGrids, so export them the same way
+        return [(name, starts, ends, [lab_converter.SILENCE_LABELS.get(label, label) for label in labels])
+                for name, starts, ends, labels in columns]
+    result = []
+    for tier in read_textgrid(path).tiers:
+        if isinstance(tier, IntervalTier) and (tiers is None or tier.name in tiers):
+            entries = tier.entries
+            result.append((tier.name, array('d', [start for start, _, _ in entries]),
+                           array('d', [end for _, end, _ in entries]), [label for _, _, label in entries]))
+    return result
+
+
+def read_chunk(task):
+    """
+    Columns for one chunk of files: blocks lists (file position in chunk, tier, interval count)
+    so file/tier codes can be expanded with np.repeat instead of one string per row.
+    """
+    paths, tiers, lab_tiers, skip_empty = task
+    blocks, starts, ends, labels, errors = [], array('d'), array('d'), [], []
+    for position, path in enumerate(paths):
+        try:
+            file_tiers = read_tiers(path, tiers, lab_tiers)
+        except (OSError, UnicodeDecodeError, ValueError, IndexError, TextGridFormatError,
+                lab_converter.ExtentionException, lab_converter.TranscriptMismatchException) as e:
+            errors.append((path, f"{type(e).__name__}: {e}"))
+            continue
+        for name, tier_starts, tier_ends, tier_labels in file_tiers:
+            if skip_empty:
+                keep = [i for i, label in enumerate(tier_labels) if label.strip()]
+                tier_starts = array('d', [tier_starts[i] for i in keep])
+                tier_ends = array('d', [tier_ends[i] for i in keep])
+                tier_labels = [tier_labels[i] for i in keep]
+            blocks.append((position, name, len(tier_labels)))
+            starts.extend(tier_starts)
+            ends.extend(tier_ends)
+            labels.extend(tier_labels)
+    return blocks, starts, ends, labels, errors
+
+
+def collect_intervals(folder, tiers=None, lab_tiers=('phoneme',), skip_empty=False, workers=1, chunk_size=200):
+    """Read every .TextGrid and .lab in folder into one DataFrame."""
+    names = sorted(f for f in os.listdir(folder) if f.endswith(('.TextGrid', '.lab')))
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+    tasks = [([os.path.join(folder, name) for name in chunk], tiers, tuple(lab_tiers), skip_empty)
+             for chunk in chunks]
+
+    file_codes, tier_names, tier_codes, counts = [], {}, [], []
+    start_parts, end_parts, labels = [], [], []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(chunks) > 1 else None
+    try:
+        results = executor.map(read_chunk, tasks) if executor else map(read_chunk, tasks)
+        for chunk_index, (blocks, starts, ends, chunk_labels, errors) in enumerate(results):
+            for path, error in errors:
+                print(f"Skipping {path}: {error}", file=sys.stderr)
+            for position, name, count in blocks:
+                file_codes.append(chunk_index * chunk_size + position)
+                tier_codes.append(tier_names.setdefault(name, len(tier_names)))
+                counts.append(count)
+            start_parts.append(np.frombuffer(starts, dtype=np.float64) if starts else np.empty(0))
+            end_parts.append(np.frombuffer(ends, dtype=np.float64) if ends else np.empty(0))
+            labels.extend(chunk_labels)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.concatenate(start_parts) if start_parts else np.empty(0)
+    ends = np.concatenate(end_parts) if end_parts else np.empty(0)
+    return pd.DataFrame({
+        'file': pd.Categorical.from_codes(np.repeat(np.asarray(file_codes, dtype=np.int64), counts),
+                                          categories=names),
+        'tier': pd.Categorical.from_codes(np.repeat(np.asarray(tier_codes, dtype=np.int64), counts),
+                                          categories=list(tier_names)),
+        'start': starts,
+        'end': ends,
+        'duration': ends - starts,
+        'label': labels,
+    })
+
+
+def write_table(df, output_path):
+    """Write by extension: .parquet, .csv, anything else as TSV."""
+    if output_path.endswith('.parquet'):
+        try:
+            df.to_parquet(output_path, index=False)
+        except ImportError as e:
+            raise RuntimeError("Writing Parquet needs pyarrow or fastparquet (pip install pyarrow)") from e
+    elif output_path.endswith('.csv'):
+        df.to_csv(output_path, index=False)
+    else:
+        df.to_csv(output_path, sep='\t', index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export all intervals of a TextGrid/.lab folder into one table.")
+    parser.add_argument('folder', help="folder containing .TextGrid and/or .lab files")
+    parser.add_argument('output', help="output table (.parquet, .tsv or .csv)")
+    parser.add_argument('--tiers', nargs='+', help="only these TextGrid tiers (default: all interval tiers)")
+    parser.add_argument('--lab-tiers', nargs='+', default=['phoneme'], choices=lab_converter.TIER_KINDS,
+                        help="tiers built from .lab files (default: phoneme)")
+    parser.add_argument('--skip-empty', action='store_true', help="leave out intervals with an empty label")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes (default: 1)")
+    args = parser.parse_args()
+
+    df = collect_intervals(args.folder, args.tiers, args.lab_tiers, args.skip_empty, args.workers)
+    write_table(df, args.output)
+    print(f"Exported {len(df)} intervals from {df['file'].nunique()} files -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
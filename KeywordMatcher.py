@@ -0,0 +1,161 @@
+# Keyword matcher for interval tiers (used by 05_CopyKeywordToTier.py and TextGridTierPipeline.py).
+# - labels and keywords are normalized the same way (NFKC, case folding, punctuation removed)
+# - single-word keywords are looked up in a set, multi-word phrases are found with an
+#   Aho-Corasick automaton over the word sequence of the tier, so a phrase may span
+#   several adjacent intervals (empty intervals in between are skipped)
+# - keyword files: one keyword or phrase per line, '#' starts a comment
+#
+# Usage: python KeywordMatcher.py keywords.txt file.TextGrid [...] [--tier words]
+
+import re
+import sys
+import argparse
+import unicodedata
+from TextGridCodec import read_textgrid, TextGridFormatError
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize(text, ignore_case=True, ignore_punctuation=True):
+    """Normalized word list of a label or keyword."""
+    text = unicodedata.normalize('NFKC', text)
+    if ignore_case:
+        text = text.casefold()
+    if ignore_punctuation:
+        text = PUNCTUATION.sub('', text)
+    return text.split()
+
+
+def read_keyword_file(path):
+    keywords = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                keywords.append(line)
+    return keywords
+
+
+class KeywordMatcher:
+    def __init__(self, keywords, ignore_case=True, ignore_punctuation=True):
+        self.ignore_case = ignore_case
+        self.ignore_punctuation = ignore_punctuation
+        self.words = set()  # single-word keywords
+        # Aho-Corasick automaton over words: goto[state] maps a word to the next state,
+        # lengths[state] lists the lengths (in words) of the phrases ending in that state
+        self.goto = [{}]
+        self.fail = [0]
+        self.lengths = [[]]
+        for keyword in keywords:
+            words = self.normalize(keyword)
+            if len(words) == 1:
+                self.words.add(words[0])
+            elif words:
+                self._add_phrase(words)
+        self._link()
+
+    @classmethod
+    def from_file(cls, path, **options):
+        return cls(read_keyword_file(path), **options)
+
+    def normalize(self, text):
+        return normalize(text, self.ignore_case, self.ignore_punctuation)
+
+    def _add_phrase(self, words):
+        state = 0
+        for word in words:
+            next_state = self.goto[state].get(word)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][word] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.lengths.append([])
+            state = next_state
+        if len(words) not in self.lengths[state]:
+            self.lengths[state].append(len(words))
+
+    def _link(self):
+        """Breadth-first failure links; each state also inherits the matches of its failure state."""
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for word, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(word, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.lengths[next_state].extend(n for n in self.lengths[self.fail[next_state]]
+                                                if n not in self.lengths[next_state])
+
+    def find_spans(self, labels):
+        """
+        (first, last) label index pairs of every keyword occurrence, non-overlapping
+        (leftmost, then longest, wins). Labels without words are skipped over.
+        """
+        # One entry per word: the index of the label it came from
+        words, owners = [], []
+        for index, label in enumerate(labels):
+            for word in self.normalize(label):
+                words.append(word)
+                owners.append(index)
+
+        matches = []  # (first word, last word)
+        state = 0
+        phrases = len(self.goto) > 1
+        for position, word in enumerate(words):
+            if word in self.words:
+                matches.append((position, position))
+            if phrases:
+                while state and word not in self.goto[state]:
+                    state = self.fail[state]
+                state = self.goto[state].get(word, 0)
+                for length in self.lengths[state]:
+                    matches.append((position - length + 1, position))
+
+        spans = []
+        covered = -1  # last word already used by a chosen match
+        for first, last in sorted(matches, key=lambda match: (match[0], -match[1])):
+            if first > covered:
+                spans.append((owners[first], owners[last]))
+                covered = last
+        # A label holding several words may still be claimed twice; keep the first claim
+        merged = []
+        for first, last in spans:
+            if merged and first <= merged[-1][1]:
+                continue
+            merged.append((first, last))
+        return merged
+
+    def match_intervals(self, entries):
+        """(start, end, label) intervals covering each keyword occurrence in a list of interval entries."""
+        labels = [label for _, _, label in entries]
+        return [(entries[first][0], entries[last][1],
+                 ' '.join(label for label in labels[first:last + 1] if label.strip()))
+                for first, last in self.find_spans(labels)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List keyword occurrences in the interval tiers of TextGrid files.")
+    parser.add_argument('keyword_file', help="one keyword or phrase per line")
+    parser.add_argument('inputs', nargs='+', help="TextGrid files")
+    parser.add_argument('--tier', default='words', help="tier to search (default: words)")
+    parser.add_argument('--exact', action='store_true', help="match case and punctuation exactly")
+    args = parser.parse_args()
+
+    matcher = KeywordMatcher.from_file(args.keyword_file, ignore_case=not args.exact,
+                                       ignore_punctuation=not args.exact)
+    for path in args.inputs:
+        try:
+            tg = read_textgrid(path)
+            if args.tier not in tg.tier_names:
+                continue
+            for start, end, label in matcher.match_intervals(tg.get_tier(args.tier).entries):
+                print(f"{path}\t{start}\t{end}\t{label}")
+        except (OSError, UnicodeDecodeError, TextGridFormatError) as e:
+            print(f"Error reading {path}: {e}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
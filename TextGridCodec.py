@@ -0,0 +1,336 @@
+# Fast reader/writer for Praat TextGrid files (long and short text format).
+# - read_textgrid: parse the file header and every tier header eagerly; a tier's
+#   intervals/points are only located (one regex skip) and parsed when .entries is read
+# - save_textgrid: tiers whose entries were never replaced are written back from the
+#   original text when the output format matches the input format; output always uses LF
+#   line endings (CRLF in reused text is converted)
+# - re-serialized tiers are written exactly like praatio's save(..., includeBlankSpaces=True)
+#
+# Usage: python TextGridCodec.py file.TextGrid [...] [--short | --long] [--output-dir DIR]
+
+import os
+import re
+import sys
+import argparse
+from math import isclose
+
+NUM = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+STR = r'"(?:[^"]|"")*"'
+END = r'[ \t]*(?:\r*\n|\Z)'  # rest of the line, including its line break (LF, CRLF or a stray CRCRLF)
+
+FILE_HEADER = re.compile(r'\ufeff?File type = "ooTextFile(?: short)?"\s*Object class = "TextGrid"\s*')
+LONG_HEADER = re.compile(rf'xmin = ({NUM})\s*xmax = ({NUM})\s*tiers\? (?:<exists>\s*size = (\d+)\s*item \[\]:|<absent>){END}')
+SHORT_HEADER = re.compile(rf'({NUM})\s+({NUM})\s+(?:<exists>\s+(\d+)|<absent>){END}')
+LONG_TIER = re.compile(rf'\s*item \[\d+\]:\s*class = "(IntervalTier|TextTier)"\s*name = ({STR})\s*'
+                       rf'xmin = ({NUM})\s*xmax = ({NUM})\s*(?:intervals|points): size = (\d+){END}')
+SHORT_TIER = re.compile(rf'\s*"(IntervalTier|TextTier)"\s+({STR})\s+({NUM})\s+({NUM})\s+(\d+){END}')
+
+# Tier bodies: the skip patterns match a whole body in one call, the item patterns pull out the values
+BODY_SKIP = {
+    ('long', 'IntervalTier'): re.compile(rf'(?:\s*intervals \[\d+\]:\s*xmin = {NUM}\s*xmax = {NUM}\s*text = {STR}{END})*'),
+    ('long', 'TextTier'): re.compile(rf'(?:\s*points \[\d+\]:\s*number = {NUM}\s*mark = {STR}{END})*'),
+    ('short', 'IntervalTier'): re.compile(rf'(?:\s*{NUM}\s+{NUM}\s+{STR}{END})*'),
+    ('short', 'TextTier'): re.compile(rf'(?:\s*{NUM}\s+{STR}{END})*'),
+}
+TRAILING_SPACE = re.compile(r'\s*\Z')
+BODY_ITEMS = {
+    ('long', 'IntervalTier'): re.compile(rf'xmin = ({NUM})\s*xmax = ({NUM})\s*text = "((?:[^"]|"")*)"'),
+    ('long', 'TextTier'): re.compile(rf'number = ({NUM})\s*mark = "((?:[^"]|"")*)"'),
+    ('short', 'IntervalTier'): re.compile(rf'({NUM})\s+({NUM})\s+"((?:[^"]|"")*)"'),
+    ('short', 'TextTier'): re.compile(rf'({NUM})\s+"((?:[^"]|"")*)"'),
+}
+
+
+class TextGridFormatError(Exception):
+    pass
+
+
+def format_number(value):
+    """Same number format as praatio: whole numbers without a fraction, otherwise repr()."""
+    return '%d' % value if isclose(value, int(value)) else repr(value)
+
+
+def quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def unquote(text):
+    text = text[1:-1] if text.startswith('"') else text
+    return text.replace('""', '"') if '""' in text else text
+
+
+class Tier:
+    tier_class = None
+
+    def __init__(self, name, entries=(), min_time=0.0, max_time=None):
+        self.name = name
+        self.min_time = min_time
+        self._entries = tuple(entries)
+        self.max_time = max_time if max_time is not None else self._default_max_time()
+        self._source = None  # (text format, body text) while the entries are those of the file
+
+    @classmethod
+    def from_source(cls, name, min_time, max_time, size, text_format, body):
+        tier = cls.__new__(cls)
+        tier.name, tier.min_time, tier.max_time = name, min_time, max_time
+        tier._entries = None
+        tier._source = (text_format, body)
+        tier._size = size
+        return tier
+
+    @property
+    def entries(self):
+        """Tuple of entries; parsed from the file text the first time it is read."""
+        if self._entries is None:
+            text_format, body = self._source
+            self._entries = tuple(self._parse(BODY_ITEMS[(text_format, self.tier_class)].findall(body)))
+            if len(self._entries) != self._size:
+                raise TextGridFormatError(f"Tier '{self.name}' declares {self._size} items "
+                                          f"but {len(self._entries)} were found")
+        return self._entries
+
+    @entries.setter
+    def entries(self, entries):
+        self._entries = tuple(entries)
+        self._source = None
+
+    def __len__(self):
+        return len(self._entries) if self._entries is not None else self._size
+
+    def _default_max_time(self):
+        return 0.0
+
+
+class IntervalTier(Tier):
+    tier_class = 'IntervalTier'
+
+    @staticmethod
+    def _parse(rows):
+        return [(float(start), float(end), unquote(label)) for start, end, label in rows]
+
+    def _default_max_time(self):
+        return max((end for _, end, _ in self._entries), default=self.min_time)
+
+    def filled_entries(self, blank_label=''):
+        """Entries with the gaps between them (and up to min_time/max_time) filled with blank intervals."""
+        entries = self.entries
+        if not entries:
+            return [(self.min_time, self.max_time, blank_label)]
+        filled = []
+        previous_end = self.min_time
+        for entry in entries:
+            if previous_end < entry[0]:
+                filled.append((previous_end, entry[0], blank_label))
+            filled.append(entry)
+            previous_end = entry[1]
+        if previous_end < self.max_time:
+            filled.append((previous_end, self.max_time, blank_label))
+        return filled
+
+
+class TextTier(Tier):
+    tier_class = 'TextTier'
+
+    @staticmethod
+    def _parse(rows):
+        return [(float(time), unquote(label)) for time, label in rows]
+
+    def _default_max_time(self):
+        return max((time for time, _ in self._entries), default=self.min_time)
+
+
+TIER_CLASSES = {'IntervalTier': IntervalTier, 'TextTier': TextTier}
+
+
+class TextGrid:
+    def __init__(self, min_time=0.0, max_time=0.0, tiers=(), text_format='short'):
+        self.min_time = min_time
+        self.max_time = max_time
+        self.tiers = list(tiers)
+        self.text_format = text_format  # format the file was read in
+
+    @property
+    def tier_names(self):
+        return [tier.name for tier in self.tiers]
+
+    def get_tier(self, name):
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise KeyError(name)
+
+    def add_tier(self, tier, index=None):
+        if tier.name in self.tier_names:
+            raise ValueError(f"Tier '{tier.name}' already exists")
+        self.tiers.insert(len(self.tiers) if index is None else index, tier)
+        self.max_time = max(self.max_time, tier.max_time)
+
+    def remove_tier(self, name):
+        tier = self.get_tier(name)
+        self.tiers.remove(tier)
+        return tier
+
+    def rename_tier(self, old_name, new_name):
+        if new_name in self.tier_names:
+            raise ValueError(f"Tier '{new_name}' already exists")
+        self.get_tier(old_name).name = new_name
+
+
+def match_header(text):
+    """Return (text format, match of the file header with groups xmin, xmax, tier count)."""
+    match = FILE_HEADER.match(text)
+    if not match:
+        raise TextGridFormatError("Not a Praat TextGrid text file")
+    position = match.end()
+    text_format = 'long' if text.startswith('xmin', position) else 'short'
+    match = (LONG_HEADER if text_format == 'long' else SHORT_HEADER).match(text, position)
+    if not match:
+        raise TextGridFormatError(f"Malformed {text_format} TextGrid header")
+    return text_format, match
+
+
+def parse_textgrid(text):
+    """Parse TextGrid text in long or short format; tier bodies are left unparsed until needed."""
+    text_format, match = match_header(text)
+    tg = TextGrid(float(match.group(1)), float(match.group(2)), text_format=text_format)
+    position = match.end()
+
+    tier_header = LONG_TIER if text_format == 'long' else SHORT_TIER
+    for index in range(int(match.group(3) or 0)):
+        match = tier_header.match(text, position)
+        if not match:
+            raise TextGridFormatError(f"Malformed header of tier {index + 1}")
+        tier_class, name, min_time, max_time, size = match.groups()
+        body = BODY_SKIP[(text_format, tier_class)].match(text, match.end())
+        tg.tiers.append(TIER_CLASSES[tier_class].from_source(
+            unquote(name), float(min_time), float(max_time), int(size), text_format, body.group()))
+        position = body.end()
+    # The skip stops at the first item it cannot match; only whitespace may follow the last tier
+    if not TRAILING_SPACE.match(text, position):
+        name = f"tier '{tg.tiers[-1].name}'" if tg.tiers else "the file header"
+        raise TextGridFormatError(f"Unreadable text after {name} at offset {position}")
+    return tg
+
+
+def decode_textgrid(data, errors='strict'):
+    """TextGrid bytes to text: UTF-16 when there is a BOM (as Praat writes non-ASCII files), else UTF-8."""
+    if data[:2] in (b'\xff\xfe', b'\xfe\xff'):
+        return data.decode('utf-16', errors)
+    return data.decode('utf-8', errors)
+
+
+def read_textgrid(path):
+    with open(path, 'rb') as f:
+        return parse_textgrid(decode_textgrid(f.read()))
+
+
+def read_textgrid_header(path, block_size=4096):
+    """(xmin, xmax, tier count) from the first block of the file, without reading any tier."""
+    with open(path, 'rb') as f:
+        # a character cut off at the end of the block cannot be part of the file header
+        text = decode_textgrid(f.read(block_size), errors='ignore')
+    _, match = match_header(text)
+    return float(match.group(1)), float(match.group(2)), int(match.group(3) or 0)
+
+
+def raw_body(tier, text_format):
+    """Original body text of a tier that can be written back unparsed in text_format, else None."""
+    if tier._source is None or tier._source[0] != text_format:
+        return None
+    body = tier._source[1]
+    count = len(BODY_ITEMS[(text_format, tier.tier_class)].findall(body))
+    if count != tier._size:
+        raise TextGridFormatError(f"Tier '{tier.name}' declares {tier._size} items but {count} were found")
+    if '\r' in body:  # read from a CRLF file; the rest of the output is written with LF
+        body = re.sub(r'\r+\n', '\n', body)
+    return body
+
+
+def iter_textgrid_text(tg, text_format='short'):
+    """
+    Yield the TextGrid text piece by piece; unchanged tiers reuse their original body text.
+    Every tier is checked before the first piece is yielded.
+    """
+    if text_format not in ('long', 'short'):
+        raise ValueError(f"Unknown TextGrid format: {text_format} (use 'long' or 'short')")
+    long = text_format == 'long'
+    bodies = [raw_body(tier, text_format) for tier in tg.tiers]
+    yield 'File type = "ooTextFile"\nObject class = "TextGrid"\n\n'
+    if long:
+        yield (f'xmin = {format_number(tg.min_time)} \nxmax = {format_number(tg.max_time)} \n'
+               f'tiers? <exists> \nsize = {len(tg.tiers)} \nitem []: \n')
+    else:
+        yield f'{format_number(tg.min_time)}\n{format_number(tg.max_time)}\n<exists>\n{len(tg.tiers)}\n'
+
+    for tier_index, (tier, body) in enumerate(zip(tg.tiers, bodies), 1):
+        raw = body is not None
+        entries = None if raw else (tier.filled_entries() if isinstance(tier, IntervalTier) else tier.entries)
+        size = len(tier) if raw else len(entries)
+        if long:
+            item = 'intervals' if isinstance(tier, IntervalTier) else 'points'
+            yield (f'    item [{tier_index}]:\n        class = "{tier.tier_class}" \n'
+                   f'        name = {quote(tier.name)} \n        xmin = {format_number(tier.min_time)} \n'
+                   f'        xmax = {format_number(tier.max_time)} \n        {item}: size = {size} \n')
+        else:
+            yield (f'"{tier.tier_class}"\n{quote(tier.name)}\n{format_number(tier.min_time)}\n'
+                   f'{format_number(tier.max_time)}\n{size}\n')
+
+        if raw:
+            yield body if not body or body.endswith('\n') else body + '\n'
+        elif isinstance(tier, IntervalTier):
+            for i, (start, end, label) in enumerate(entries, 1):
+                if long:
+                    yield (f'        intervals [{i}]:\n            xmin = {format_number(start)} \n'
+                           f'            xmax = {format_number(end)} \n            text = {quote(label)} \n')
+                else:
+                    yield f'{format_number(start)}\n{format_number(end)}\n{quote(label)}\n'
+        else:
+            for i, (time, label) in enumerate(entries, 1):
+                if long:
+                    yield (f'        points [{i}]:\n            number = {format_number(time)} \n'
+                           f'            mark = {quote(label)} \n')
+                else:
+                    yield f'{format_number(time)}\n{quote(label)}\n'
+
+
+def save_textgrid(tg, path, text_format='short'):
+    """Write a TextGrid as UTF-8 in Praat's long or short text format, with LF line endings."""
+    pieces = iter_textgrid_text(tg, text_format)
+    first = next(pieces)  # checks every tier before the file (possibly the input) is truncated
+    # newline='' writes the text as it is, so no platform translates the line endings a second time
+    with open(path, 'w', encoding='utf-8', newline='', buffering=1 << 16) as f:
+        f.write(first)
+        f.writelines(pieces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite TextGrid files in Praat's short or long text format.")
+    parser.add_argument('inputs', nargs='+', help="TextGrid files or folders containing TextGrid files")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--short', dest='text_format', action='store_const', const='short', default='short',
+                       help="write the short text format (default)")
+    group.add_argument('--long', dest='text_format', action='store_const', const='long',
+                       help="write the long text format")
+    parser.add_argument('--output-dir', help="write the files here instead of replacing the inputs")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            paths.extend(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith('.TextGrid'))
+        else:
+            paths.append(path)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    for path in paths:
+        dst = os.path.join(args.output_dir, os.path.basename(path)) if args.output_dir else path
+        try:
+            save_textgrid(read_textgrid(path), dst, args.text_format)
+            print(f"Converted: {path} -> {dst}")
+        except (OSError, UnicodeDecodeError, TextGridFormatError) as e:
+            print(f"Error converting {path}: {e}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
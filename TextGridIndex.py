@@ -0,0 +1,249 @@
+# SQLite index of every interval in a TextGrid corpus: (file, tier, start, end, label).
+# - update: (re)indexes only TextGrids whose mtime/size changed and drops deleted ones
+# - label / regex / time-range queries answered from the index without opening any TextGrid
+# - keywords: runs a KeywordMatcher over an indexed tier (same result as 05_CopyKeywordToTier.py)
+#
+# Usage: python TextGridIndex.py corpus.sqlite update textgrids [--workers 4]
+#        python TextGridIndex.py corpus.sqlite label sweet [--tier words]
+#        python TextGridIndex.py corpus.sqlite regex "^s.*er$" [--tier words]
+#        python TextGridIndex.py corpus.sqlite time textgrids/a.TextGrid 0.5 1.2
+#        python TextGridIndex.py corpus.sqlite keywords keywords.txt [--tier words]
+
+import os
+import re
+import sys
+import sqlite3
+import argparse
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from TextGridCodec import read_textgrid, TextGridFormatError, IntervalTier
+from KeywordMatcher import KeywordMatcher
+
+SQLITE_MAX_PARAMETERS = 500  # labels per IN (...) query
+
+
+def textgrid_rows(path):
+    """
+    (mtime_ns, size, xmin, xmax, rows) for one TextGrid, rows being (tier, position, start, end, label).
+    Points of a TextTier are stored with start == end.
+    """
+    stat = os.stat(path)
+    tg = read_textgrid(path)
+    rows = []
+    for tier in tg.tiers:
+        if isinstance(tier, IntervalTier):
+            rows.extend((tier.name, position, start, end, label)
+                        for position, (start, end, label) in enumerate(tier.entries))
+        else:
+            rows.extend((tier.name, position, time, time, label)
+                        for position, (time, label) in enumerate(tier.entries))
+    return stat.st_mtime_ns, stat.st_size, tg.min_time, tg.max_time, rows
+
+
+def textgrid_rows_chunk(paths):
+    results = []
+    for path in paths:
+        try:
+            results.append((textgrid_rows(path), None))
+        except (OSError, UnicodeDecodeError, TextGridFormatError) as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class TextGridIndex:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS files (
+                                           id INTEGER PRIMARY KEY,
+                                           folder TEXT NOT NULL,
+                                           name TEXT NOT NULL,
+                                           mtime_ns INTEGER,
+                                           size INTEGER,
+                                           xmin REAL,
+                                           xmax REAL,
+                                           UNIQUE (folder, name))''')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS intervals (
+                                           file_id INTEGER NOT NULL,
+                                           tier TEXT NOT NULL,
+                                           position INTEGER NOT NULL,
+                                           xmin REAL NOT NULL,
+                                           xmax REAL NOT NULL,
+                                           label TEXT NOT NULL)''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS intervals_label ON intervals (label, tier)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS intervals_file ON intervals (file_id, tier, xmin)')
+
+    def update(self, folder, workers=1, chunk_size=200):
+        """
+        Bring the index of folder up to date: new and changed TextGrids (by mtime and size)
+        are parsed, optionally in a process pool, and removed ones are dropped.
+        Returns (indexed, removed, unchanged, failed).
+        """
+        folder = os.path.abspath(folder)
+        known = {name: (file_id, mtime_ns, size) for file_id, name, mtime_ns, size in self.connection.execute(
+            'SELECT id, name, mtime_ns, size FROM files WHERE folder = ?', (folder,))}
+
+        changed, unchanged = [], 0
+        with os.scandir(folder) as entries:
+            present = set()
+            for entry in entries:
+                if not entry.name.endswith('.TextGrid'):
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                previous = known.get(entry.name)
+                if previous and previous[1:] == (stat.st_mtime_ns, stat.st_size):
+                    unchanged += 1
+                else:
+                    changed.append(entry.name)
+        removed = [known[name][0] for name in known.keys() - present]
+        with self.connection:
+            self._delete_files(removed)
+
+        chunks = [changed[i:i + chunk_size] for i in range(0, len(changed), chunk_size)]
+        path_chunks = [[os.path.join(folder, name) for name in chunk] for chunk in chunks]
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(chunks) > 1 else None
+        indexed = failed = 0
+        try:
+            results = (executor.map(textgrid_rows_chunk, path_chunks) if executor
+                       else map(textgrid_rows_chunk, path_chunks))
+            for chunk, chunk_results in zip(chunks, results):
+                # one transaction per chunk keeps the index consistent if the run is interrupted
+                with self.connection:
+                    for name, (parsed, error) in zip(chunk, chunk_results):
+                        if name in known:
+                            self._delete_files([known[name][0]])
+                        if error is not None:
+                            failed += 1
+                            print(f"Error indexing {os.path.join(folder, name)}: {error}", file=sys.stderr)
+                            continue
+                        mtime_ns, size, xmin, xmax, rows = parsed
+                        file_id = self.connection.execute(
+                            'INSERT INTO files (folder, name, mtime_ns, size, xmin, xmax) VALUES (?, ?, ?, ?, ?, ?)',
+                            (folder, name, mtime_ns, size, xmin, xmax)).lastrowid
+                        self.connection.executemany(
+                            'INSERT INTO intervals (file_id, tier, position, xmin, xmax, label) VALUES (?, ?, ?, ?, ?, ?)',
+                            [(file_id, *row) for row in rows])
+                        indexed += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return indexed, len(removed), unchanged, failed
+
+    def _delete_files(self, file_ids):
+        file_ids = [(file_id,) for file_id in file_ids]
+        self.connection.executemany('DELETE FROM intervals WHERE file_id = ?', file_ids)
+        self.connection.executemany('DELETE FROM files WHERE id = ?', file_ids)
+
+    def _select(self, where, parameters, order='f.folder, f.name, i.tier, i.position'):
+        return [(os.path.join(folder, name), tier, xmin, xmax, label)
+                for folder, name, tier, xmin, xmax, label in self.connection.execute(
+                    f'''SELECT f.folder, f.name, i.tier, i.xmin, i.xmax, i.label
+                        FROM intervals i JOIN files f ON f.id = i.file_id
+                        WHERE {where} ORDER BY {order}''', parameters)]
+
+    def find_label(self, label, tier=None):
+        """Intervals whose label is exactly label, as (path, tier, start, end, label)."""
+        if tier is None:
+            return self._select('i.label = ?', (label,))
+        return self._select('i.label = ? AND i.tier = ?', (label, tier))
+
+    def find_regex(self, pattern, tier=None):
+        """
+        Intervals whose label matches the regex (re.search). The pattern is tested once per
+        distinct label; the matching labels are then looked up through the label index.
+        """
+        regex = re.compile(pattern)
+        labels = [label for (label,) in self.connection.execute('SELECT DISTINCT label FROM intervals')
+                  if regex.search(label)]
+        rows = []
+        for i in range(0, len(labels), SQLITE_MAX_PARAMETERS):
+            batch = labels[i:i + SQLITE_MAX_PARAMETERS]
+            where = f"i.label IN ({', '.join('?' * len(batch))})"
+            if tier is not None:
+                where += ' AND i.tier = ?'
+                batch = batch + [tier]
+            rows.extend(self._select(where, batch))
+        rows.sort()
+        return rows
+
+    def find_time(self, path, start, end, tier=None):
+        """
+        Intervals of one TextGrid that overlap the open range (start, end): an interval that only
+        touches the range (ends at start or begins at end) is not included, nor is a point on a bound.
+        """
+        folder, name = os.path.split(os.path.abspath(path))
+        where = 'f.folder = ? AND f.name = ? AND i.xmin < ? AND i.xmax > ?'
+        parameters = [folder, name, end, start]
+        if tier is not None:
+            where += ' AND i.tier = ?'
+            parameters.append(tier)
+        return self._select(where, parameters, order='i.tier, i.position')
+
+    def tier_entries(self, tier):
+        """Yield (path, entries) for every indexed TextGrid that has the tier, entries in tier order."""
+        rows = self.connection.execute(
+            '''SELECT f.folder, f.name, i.xmin, i.xmax, i.label
+               FROM intervals i JOIN files f ON f.id = i.file_id
+               WHERE i.tier = ? ORDER BY f.folder, f.name, i.position''', (tier,))
+        for (folder, name), group in groupby(rows, key=lambda row: row[:2]):
+            yield os.path.join(folder, name), [(xmin, xmax, label) for _, _, xmin, xmax, label in group]
+
+    def find_keywords(self, matcher, tier='words'):
+        """KeywordMatcher hits over the indexed tier, as (path, start, end, label)."""
+        if not isinstance(matcher, KeywordMatcher):
+            matcher = KeywordMatcher(matcher)
+        return [(path, start, end, label) for path, entries in self.tier_entries(tier)
+                for start, end, label in matcher.match_intervals(entries)]
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the intervals of a TextGrid corpus in SQLite and query them.")
+    parser.add_argument('index', help="SQLite index file (created if missing)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help="index new and changed TextGrids of a folder")
+    update.add_argument('folder')
+    update.add_argument('--workers', type=int, default=1, help="worker processes (default: 1)")
+    label = commands.add_parser('label', help="intervals with exactly this label")
+    label.add_argument('label')
+    regex = commands.add_parser('regex', help="intervals whose label matches a regular expression")
+    regex.add_argument('pattern')
+    time_range = commands.add_parser('time', help="intervals of one TextGrid overlapping a time range")
+    time_range.add_argument('path')
+    time_range.add_argument('start', type=float)
+    time_range.add_argument('end', type=float)
+    keywords = commands.add_parser('keywords', help="keyword/phrase matches (see KeywordMatcher.py)")
+    keywords.add_argument('keyword_file')
+    for command in (label, regex, time_range, keywords):
+        command.add_argument('--tier', default='words' if command is keywords else None, help="only this tier")
+    args = parser.parse_args()
+
+    index = TextGridIndex(args.index)
+    try:
+        if args.command == 'update':
+            indexed, removed, unchanged, failed = index.update(args.folder, workers=args.workers)
+            print(f"Indexed {indexed}, removed {removed}, unchanged {unchanged}, failed {failed}")
+            return
+        if args.command == 'label':
+            rows = index.find_label(args.label, args.tier)
+        elif args.command == 'regex':
+            rows = index.find_regex(args.pattern, args.tier)
+        elif args.command == 'time':
+            rows = index.find_time(args.path, args.start, args.end, args.tier)
+        else:
+            rows = [(path, args.tier, start, end, label) for path, start, end, label
+                    in index.find_keywords(KeywordMatcher.from_file(args.keyword_file), args.tier)]
+        for row in rows:
+            print('\t'.join(map(str, row)))
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# Apply several tier operations to every TextGrid in a folder, parsing and saving each file once.
+# Combines 04_AddAnotherIntervalTierTextGrid.py and 05_CopyKeywordToTier.py (and more) into one pass:
+# - AddEmptyTier: add a tier with one empty interval over the whole file (04)
+# - CopyKeywordIntervals: copy the keyword intervals (see KeywordMatcher.py) of one tier into another tier (05)
+# - RenameTier / DeleteTier
+#
+# Usage: python TextGridTierPipeline.py input_dir output_dir --add-tier TargetWord
+#            --copy-keywords "songwriter,sweet,dry" [--keyword-file keywords.txt]
+#            [--rename old=new] [--delete tier] [--workers 4]
+# Operations run in the order they are given on the command line.
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from TextGridCodec import read_textgrid, save_textgrid, IntervalTier
+from KeywordMatcher import KeywordMatcher
+
+
+class SkipOperation(Exception):
+    """Raised by an operation that leaves the TextGrid unchanged; the message says why."""
+    pass
+
+
+class AddEmptyTier:
+    def __init__(self, name="TargetWord"):
+        self.name = name
+
+    def apply(self, tg):
+        if self.name in tg.tier_names:
+            raise SkipOperation(f"Tier '{self.name}' already exists")
+        min_time, max_time = tg.min_time, tg.max_time
+        tg.add_tier(IntervalTier(self.name, [(min_time, max_time, "")], min_time=min_time, max_time=max_time))
+        return f"added tier '{self.name}'"
+
+
+class CopyKeywordIntervals:
+    def __init__(self, keywords, source_tier="words", target_tier="TargetWord"):
+        # keywords: a KeywordMatcher, or keywords/phrases to build one from
+        self.matcher = keywords if isinstance(keywords, KeywordMatcher) else KeywordMatcher(keywords)
+        self.source_tier = source_tier
+        self.target_tier = target_tier
+
+    def apply(self, tg):
+        if self.source_tier not in tg.tier_names:
+            raise SkipOperation(f"{self.source_tier} Tier not found")
+        target_intervals = self.matcher.match_intervals(tg.get_tier(self.source_tier).entries)
+        if not target_intervals:
+            raise SkipOperation("No keywords found")
+
+        # An existing target tier is replaced; the new one goes to the bottom
+        if self.target_tier in tg.tier_names:
+            tg.remove_tier(self.target_tier)
+        tg.add_tier(IntervalTier(self.target_tier, target_intervals, min_time=tg.min_time, max_time=tg.max_time))
+        return f"copied {len(target_intervals)} keyword interval(s) to '{self.target_tier}'"
+
+
+class RenameTier:
+    def __init__(self, old_name, new_name):
+        self.old_name = old_name
+        self.new_name = new_name
+
+    def apply(self, tg):
+        if self.old_name not in tg.tier_names:
+            raise SkipOperation(f"Tier '{self.old_name}' not found")
+        if self.new_name in tg.tier_names:
+            raise SkipOperation(f"Tier '{self.new_name}' already exists")
+        tg.rename_tier(self.old_name, self.new_name)
+        return f"renamed tier '{self.old_name}' to '{self.new_name}'"
+
+
+class DeleteTier:
+    def __init__(self, name):
+        self.name = name
+
+    def apply(self, tg):
+        if self.name not in tg.tier_names:
+            raise SkipOperation(f"Tier '{self.name}' not found")
+        tg.remove_tier(self.name)
+        return f"deleted tier '{self.name}'"
+
+
+class TierPipeline:
+    def __init__(self, operations, output_format="short"):
+        self.operations = list(operations)
+        self.output_format = output_format
+
+    def process_file(self, textgrid_path, output_path):
+        """
+        Apply every operation in order to one TextGrid and save it once if any of them changed it.
+        Returns (saved, notes) with one note per operation.
+        """
+        tg = read_textgrid(textgrid_path)
+        notes, changed = [], False
+        for operation in self.operations:
+            try:
+                notes.append(operation.apply(tg))
+                changed = True
+            except SkipOperation as e:
+                notes.append(f"skipped: {e}")
+        if changed:
+            save_textgrid(tg, output_path, self.output_format)
+        return changed, notes
+
+    def process_chunk(self, tasks):
+        """Run process_file over (textgrid_path, output_path) pairs; returns (saved, notes, error) per pair."""
+        results = []
+        for textgrid_path, output_path in tasks:
+            try:
+                results.append((*self.process_file(textgrid_path, output_path), None))
+            except Exception as e:  # a broken file must not stop the rest of the chunk
+                results.append((False, [], f"{type(e).__name__}: {e}"))
+        return results
+
+    def run(self, input_dir, output_dir, workers=1, chunk_size=100):
+        """Process every .TextGrid in input_dir; workers > 1 hands chunks of files to a process pool."""
+        os.makedirs(output_dir, exist_ok=True)
+        tasks = [(os.path.join(input_dir, filename), os.path.join(output_dir, filename))
+                 for filename in sorted(os.listdir(input_dir)) if filename.endswith(".TextGrid")]
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+        saved = 0
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(chunks) > 1 else None
+        try:
+            results = executor.map(self.process_chunk, chunks) if executor else map(self.process_chunk, chunks)
+            for chunk, chunk_results in zip(chunks, results):
+                for (textgrid_path, output_path), (changed, notes, error) in zip(chunk, chunk_results):
+                    if error is not None:
+                        print(f"Error in {textgrid_path}: {error}")
+                    elif changed:
+                        saved += 1
+                        print(f"Updated TextGrid saved: {output_path} ({'; '.join(notes)})")
+                    else:
+                        print(f"Unchanged {textgrid_path}: {'; '.join(notes)}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return saved, len(tasks)
+
+
+def rename_operation(value):
+    old_name, sep, new_name = value.partition("=")
+    if not sep or not old_name or not new_name:
+        raise argparse.ArgumentTypeError(f"expected OLD=NEW, got {value!r}")
+    return RenameTier(old_name, new_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply tier operations to every TextGrid in a folder in one pass.")
+    parser.add_argument("input_dir", help="folder containing .TextGrid files")
+    parser.add_argument("output_dir", help="folder for the updated TextGrids (may be input_dir)")
+    # All operations share one list so they keep their command-line order
+    parser.add_argument("--add-tier", dest="operations", action="append", type=AddEmptyTier, metavar="NAME",
+                        help="add an empty interval tier (like 04_AddAnotherIntervalTierTextGrid.py)")
+    parser.add_argument("--copy-keywords", dest="operations", action="append", metavar="WORDS",
+                        type=lambda words: CopyKeywordIntervals(w.strip() for w in words.split(",") if w.strip()),
+                        help="comma separated keywords copied from 'words' to 'TargetWord' (like 05_CopyKeywordToTier.py)")
+    parser.add_argument("--keyword-file", dest="operations", action="append", metavar="PATH",
+                        type=lambda path: CopyKeywordIntervals(KeywordMatcher.from_file(path)),
+                        help="like --copy-keywords, with one keyword or phrase per line of a file")
+    parser.add_argument("--rename", dest="operations", action="append", type=rename_operation, metavar="OLD=NEW",
+                        help="rename a tier")
+    parser.add_argument("--delete", dest="operations", action="append", type=DeleteTier, metavar="NAME",
+                        help="delete a tier")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default: 1)")
+    args = parser.parse_args()
+    if not args.operations:
+        parser.error("no operations given")
+
+    saved, total = TierPipeline(args.operations).run(args.input_dir, args.output_dir, workers=args.workers)
+    print(f"{saved} of {total} TextGrid files have been updated.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# RIFF/WAVE header reader without third-party dependencies.
+# Used by WavTools.py and by scripts that only need the format or the duration of a WAV
+# (02_JuliusAutomaticProcessing.py, DurationQC.py) so that they do not have to import NumPy.
+
+import os
+import struct
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavFormatError(Exception):
+    pass
+
+
+class WavHeader:
+    def __init__(self, format_tag, channels, sample_rate, bits_per_sample, data_offset, data_size):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.data_offset = data_offset
+        self.data_size = data_size
+
+    @property
+    def frames(self):
+        return self.data_size // (self.channels * self.bits_per_sample // 8)
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+
+def read_wav_header(path):
+    """Read the RIFF header of a WAV file without touching the sample data."""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise WavFormatError(f"{path} is not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise WavFormatError(f"No data chunk found in {path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'fmt ':
+                body = f.read(chunk_size)
+                format_tag, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    format_tag = struct.unpack('<H', body[24:26])[0]  # first 2 bytes of the SubFormat GUID
+                fmt = (format_tag, channels, sample_rate, bits)
+                f.seek(chunk_size & 1, 1)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise WavFormatError(f"data chunk before fmt chunk in {path}")
+                data_offset = f.tell()
+                # Streamed WAVs may carry a placeholder size; trust the file length instead
+                data_size = min(chunk_size, file_size - data_offset)
+                return WavHeader(*fmt, data_offset, data_size)
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
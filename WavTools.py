@@ -0,0 +1,176 @@
+# Small WAV toolkit shared by the converter and the alignment scripts.
+# - read_wav_header: parse only the RIFF header (format, rate, channels, length; from WavHeader.py)
+# - read_wav: memory-map the sample data as a NumPy array without copying it
+# - to_mono / resample_poly: vectorized downmix and polyphase resampler
+# - write_wav: write PCM16 or 32-bit float WAV
+# - convert_wav: f32/PCM WAV -> 16kHz mono in-process (replaces a second FFmpeg call)
+#
+# Usage: python WavTools.py input.wav [more.wav | folder ...] [--rate 16000] [--format pcm16]
+
+import os
+import sys
+import struct
+import argparse
+from math import gcd
+import numpy as np
+from WavHeader import (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_EXTENSIBLE,
+                       WavFormatError, WavHeader, read_wav_header)
+
+SAMPLE_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+}
+
+
+def sample_dtype(header):
+    """NumPy dtype of the samples described by a WavHeader."""
+    try:
+        return SAMPLE_DTYPES[(header.format_tag, header.bits_per_sample)]
+    except KeyError:
+        raise WavFormatError(f"Unsupported WAV sample format: tag {header.format_tag:#x}, "
+                             f"{header.bits_per_sample} bits")
+
+
+def read_wav(path):
+    """
+    Return (samples, sample_rate) with samples memory-mapped as a (frames, channels) array
+    in the file's own sample type.
+    """
+    header = read_wav_header(path)
+    samples = np.memmap(path, dtype=sample_dtype(header), mode='r', offset=header.data_offset,
+                        shape=(header.frames, header.channels))
+    return samples, header.sample_rate
+
+
+def to_float32(samples):
+    """Scale integer PCM to [-1, 1) float32; float samples are only cast."""
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128.0) / 128.0
+    if samples.dtype.kind == 'i':
+        return samples.astype(np.float32) / float(-np.iinfo(samples.dtype).min)
+    return samples.astype(np.float32, copy=False)
+
+
+def to_mono(samples):
+    """Average the channels of a (frames, channels) array into a 1-D float32 signal."""
+    samples = to_float32(samples)
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def design_lowpass(up, down, half_width=10, beta=5.0):
+    """Kaiser-windowed sinc anti-aliasing filter for resampling by up/down (gain = up)."""
+    max_rate = max(up, down)
+    cutoff = 1.0 / max_rate  # relative to the Nyquist frequency of the upsampled signal
+    half_len = half_width * max_rate
+    n = np.arange(-half_len, half_len + 1)
+    h = cutoff * np.sinc(cutoff * n) * np.kaiser(2 * half_len + 1, beta)
+    return h * (up / h.sum())
+
+
+def resample_poly(signal, orig_rate, target_rate, half_width=10, beta=5.0, block_size=1 << 15):
+    """
+    Resample a 1-D signal from orig_rate to target_rate with a polyphase FIR filter.
+    Only the filter phases that hit non-zero input samples are evaluated, and each
+    block of output samples is computed with one gather + row-wise dot product.
+    """
+    signal = np.asarray(signal, dtype=np.float32)
+    g = gcd(int(orig_rate), int(target_rate))
+    up, down = int(target_rate) // g, int(orig_rate) // g
+    if up == down:
+        return signal.copy()
+
+    h = design_lowpass(up, down, half_width, beta)
+    center = (len(h) - 1) // 2
+    taps = -(-len(h) // up)
+    # phases[p, k] = h[p + k * up]
+    padded_h = np.zeros(taps * up)
+    padded_h[:len(h)] = h
+    phases = padded_h.reshape(taps, up).T.astype(np.float32)
+
+    # Zero padding on both sides so every filter window stays inside the buffer
+    x = np.concatenate([np.zeros(taps, np.float32), signal, np.zeros(taps + 2, np.float32)])
+    n_out = -(-len(signal) * up // down)
+    out = np.empty(n_out, dtype=np.float32)
+    k = np.arange(taps)
+    for start in range(0, n_out, block_size):
+        n = np.arange(start, min(start + block_size, n_out), dtype=np.int64)
+        t = n * down + center
+        last_input, phase = np.divmod(t, up)
+        windows = x[(last_input + taps)[:, None] - k[None, :]]
+        out[start:start + len(n)] = np.einsum('nk,nk->n', phases[phase], windows)
+    return out
+
+
+def write_wav(path, samples, sample_rate, sample_format='pcm16'):
+    """Write a 1-D (mono) or (frames, channels) float array as PCM16 or 32-bit float WAV."""
+    samples = np.asarray(samples)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    if sample_format == 'pcm16':
+        data = np.clip(np.round(samples * 32768.0), -32768, 32767).astype('<i2')
+        format_tag, bits = WAVE_FORMAT_PCM, 16
+    elif sample_format == 'f32':
+        data = samples.astype('<f4')
+        format_tag, bits = WAVE_FORMAT_IEEE_FLOAT, 32
+    else:
+        raise ValueError(f"Unknown sample format: {sample_format} (use 'pcm16' or 'f32')")
+
+    block_align = channels * bits // 8
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4sI4s4sIHHIIHH4sI',
+                            b'RIFF', 36 + data.nbytes, b'WAVE',
+                            b'fmt ', 16, format_tag, channels, sample_rate,
+                            sample_rate * block_align, block_align, bits,
+                            b'data', data.nbytes))
+        data.tofile(f)
+
+
+def convert_wav(src, dst=None, target_rate=16000, sample_format='pcm16'):
+    """
+    Downmix and resample a WAV file in-process. dst defaults to src (replaced atomically).
+    """
+    dst = dst or src
+    samples, sample_rate = read_wav(src)
+    mono = resample_poly(to_mono(samples), sample_rate, target_rate)
+    del samples  # release the memory map before src may be replaced
+
+    temp_path = f"{dst}.tmp"
+    write_wav(temp_path, mono, target_rate, sample_format)
+    os.replace(temp_path, dst)
+    return dst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downmix and resample WAV files in place (or into --output-dir).")
+    parser.add_argument('inputs', nargs='+', help="WAV files or folders containing WAV files")
+    parser.add_argument('--rate', type=int, default=16000, help="target sample rate (default: 16000)")
+    parser.add_argument('--format', choices=['pcm16', 'f32'], default='pcm16', help="output sample format")
+    parser.add_argument('--output-dir', help="write converted files here instead of replacing the inputs")
+    args = parser.parse_args()
+
+    wav_files = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            wav_files.extend(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.lower().endswith('.wav'))
+        else:
+            wav_files.append(path)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    for wav_file in wav_files:
+        dst = os.path.join(args.output_dir, os.path.basename(wav_file)) if args.output_dir else wav_file
+        try:
+            convert_wav(wav_file, dst, args.rate, args.format)
+            print(f"Converted: {wav_file} -> {dst}")
+        except (OSError, WavFormatError) as e:
+            print(f"Error converting {wav_file}: {e}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
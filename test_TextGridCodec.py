@@ -0,0 +1,39 @@
+# Round-trip checks for TextGridCodec.py (run with: python -m pytest test_TextGridCodec.py)
+
+import pytest
+from TextGridCodec import TextGrid, IntervalTier, TextTier, iter_textgrid_text, read_textgrid, save_textgrid
+
+
+def sample_textgrid():
+    return TextGrid(0.0, 2.0, [
+        IntervalTier('words', [(0.0, 0.5, ''), (0.5, 1.2, 'sweet "dry"'), (1.2, 2.0, '')], 0.0, 2.0),
+        TextTier('points', [(0.75, 'a'), (1.5, 'b')], 0.0, 2.0),
+    ])
+
+
+def entries(tg):
+    return [(tier.name, list(tier.entries)) for tier in tg.tiers]
+
+
+@pytest.mark.parametrize('text_format', ['long', 'short'])
+def test_crlf_round_trip(tmp_path, text_format):
+    lf_text = ''.join(iter_textgrid_text(sample_textgrid(), text_format))
+    crlf_path = tmp_path / 'crlf.TextGrid'
+    crlf_path.write_bytes(lf_text.replace('\n', '\r\n').encode('utf-8'))
+
+    tg = read_textgrid(crlf_path)
+    assert entries(tg) == entries(sample_textgrid())
+
+    # Unchanged tiers are reused as raw text; the output must still have LF line endings only
+    out_path = tmp_path / 'out.TextGrid'
+    save_textgrid(read_textgrid(crlf_path), out_path, text_format)
+    assert out_path.read_bytes() == lf_text.encode('utf-8')
+    assert entries(read_textgrid(out_path)) == entries(sample_textgrid())
+
+
+def test_stray_carriage_returns_are_read(tmp_path):
+    # What a text-mode writer on Windows made of CRLF bodies: CR CR LF
+    text = ''.join(iter_textgrid_text(sample_textgrid(), 'short')).replace('\n', '\r\r\n')
+    path = tmp_path / 'crcrlf.TextGrid'
+    path.write_bytes(text.encode('utf-8'))
+    assert entries(read_textgrid(path)) == entries(sample_textgrid())